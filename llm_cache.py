@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+LLM 응답 캐시
+
+(모델, 시스템 프롬프트, 사용자 프롬프트) 해시를 키로 LLM 응답을 SQLite에 저장하여
+같은 입력으로 다시 실행할 때 API 호출을 건너뜁니다.
+"""
+
+import os
+import time
+import sqlite3
+import threading
+import hashlib
+from typing import Optional
+
+DEFAULT_CACHE_PATH = os.path.join("~", ".cache", "md-tag", "cache.db")
+
+
+class LLMCache:
+    def __init__(self, path: str = DEFAULT_CACHE_PATH):
+        """
+        캐시 초기화
+
+        Args:
+            path: SQLite 데이터베이스 파일 경로
+        """
+        self.path = os.path.expanduser(path)
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        # 여러 프로세스가 동시에 읽을 수 있도록 WAL 모드 사용
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, content BLOB, ts INT)"
+        )
+        self.conn.commit()
+        # 스레드 풀에서 같은 연결을 공유할 때 조회/저장이 섞이지 않도록 보호
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(model: str, system: str, user: str) -> str:
+        """모델과 프롬프트로 캐시 키를 계산합니다."""
+        return hashlib.sha256(f"{model}|{system}|{user}".encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """캐시된 응답을 반환합니다. 없으면 None을 반환합니다."""
+        with self._lock:
+            row = self.conn.execute("SELECT content FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        content = row[0]
+        return content.decode("utf-8") if isinstance(content, bytes) else content
+
+    def set(self, key: str, content: str):
+        """응답을 캐시에 저장합니다."""
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses (key, content, ts) VALUES (?, ?, ?)",
+                (key, content.encode("utf-8"), int(time.time()))
+            )
+            self.conn.commit()
+
+    def close(self):
+        """데이터베이스 연결을 닫습니다."""
+        self.conn.close()
@@ -1,23 +1,19 @@
 from dotenv import load_dotenv
 import sys
 import os
-import re
+import shutil
+import asyncio
 
 load_dotenv()
 
 from langchain_openai import ChatOpenAI
+from openai_worker import AsyncOpenAIWorker, make_async_http_client
 
-def process_markdown_file(file_path):
+async def process_markdown_file(file_path, llm, worker):
     try:
         with open(file_path, 'r', encoding='utf-8') as file:
             content = file.read()
         
-        # 객체 생성
-        llm = ChatOpenAI(
-            temperature=0.0,  # 창의성 (0.0 ~ 2.0)
-            model_name="gpt-4.1-mini",  # 모델명
-        )
-        
         # 기존 프론트매터에서 tags 추출 및 업데이트 요청
         question = f"""다음 마크다운 파일을 처리해주세요:
 
@@ -45,22 +41,40 @@ author: 기존값
 파일 내용:
 {content}"""
         
-        # 질의
-        response = llm.invoke(question)
+        # 질의 (응답은 수정된 문서 전체이므로 원본 토큰 수만큼 응답 토큰을 함께 예약)
+        token_cost = worker.estimate_tokens(question, completion_tokens=worker.estimate_tokens(content))
+        response = await worker.submit(lambda: llm.ainvoke(question), token_cost)
         processed_content = response.content
         
-        # 백틱 코드 블록 제거
-        processed_content = re.sub(r'^```\w*\n', '', processed_content, flags=re.MULTILINE)
-        processed_content = re.sub(r'\n```$', '', processed_content)
+        # 응답 전체를 감싼 백틱 코드 블록만 제거 (본문 안의 코드 블록은 유지)
         processed_content = processed_content.strip()
+        if processed_content.startswith('```'):
+            newline_index = processed_content.find('\n')
+            if newline_index != -1:
+                processed_content = processed_content[newline_index + 1:]
+        if processed_content.endswith('```'):
+            processed_content = processed_content[:-3].rstrip()
         
         # 출력 파일명 생성 (파일명_fix.md)
         base_name = os.path.splitext(file_path)[0]
         output_file = f"{base_name}_fix.md"
         
-        # 수정된 내용을 파일로 저장
-        with open(output_file, 'w', encoding='utf-8') as file:
-            file.write(processed_content)
+        # 수정된 내용을 임시 파일에 쓴 뒤 교체하여 저장 (쓰기 도중 실패해도 깨진 파일이 남지 않음)
+        # 기존 출력 파일이 심볼릭 링크면 링크 대상을 교체하고, 기존 권한을 유지
+        target_file = os.path.realpath(output_file)
+        tmp_file = f"{target_file}.tmp"
+        try:
+            with open(tmp_file, 'w', encoding='utf-8') as file:
+                file.write(processed_content)
+                file.flush()
+                os.fsync(file.fileno())
+            if os.path.exists(target_file):
+                shutil.copymode(target_file, tmp_file)
+            os.replace(tmp_file, target_file)
+        except BaseException:
+            if os.path.exists(tmp_file):
+                os.unlink(tmp_file)
+            raise
         
         print(f"처리 완료: {output_file}")
         print("\n--- 처리된 내용 ---")
@@ -71,10 +85,21 @@ author: 기존값
     except Exception as e:
         print(f"오류: {str(e)}")
 
+async def process_markdown_files(file_paths):
+    # 객체 생성 (모든 파일이 같은 클라이언트와 연결 풀을 재사용)
+    llm = ChatOpenAI(
+        temperature=0.0,  # 창의성 (0.0 ~ 2.0)
+        model_name="gpt-4.1-mini",  # 모델명
+        max_retries=0,  # 재시도는 AsyncOpenAIWorker가 담당
+        http_async_client=make_async_http_client(),
+    )
+    worker = AsyncOpenAIWorker()
+    
+    await asyncio.gather(*(process_markdown_file(file_path, llm, worker) for file_path in file_paths))
+
 if __name__ == "__main__":
-    if len(sys.argv) != 2:
-        print("사용법: python main.py <파일경로>")
+    if len(sys.argv) < 2:
+        print("사용법: python main.py <파일경로> [<파일경로> ...]")
         sys.exit(1)
     
-    file_path = sys.argv[1]
-    process_markdown_file(file_path)
+    asyncio.run(process_markdown_files(sys.argv[1:]))
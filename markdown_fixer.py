@@ -4,64 +4,84 @@ Markdown Fixer using OpenAI gpt-4o-mini to fix markdownlint-cli2 errors
 """
 
 import os
+import re
 import sys
+import json
+import functools
+import time
+import asyncio
+import shutil
+import tempfile
 import subprocess
 import argparse
 from pathlib import Path
-from openai import OpenAI
+from concurrent.futures import ProcessPoolExecutor
+from openai import AsyncOpenAI, OpenAI
 from dotenv import load_dotenv
+from openai_worker import AsyncOpenAIWorker, make_async_http_client
+from llm_cache import LLMCache, DEFAULT_CACHE_PATH
 
 # Load environment variables from .env file
 load_dotenv()
 
-def run_markdownlint(file_path):
-    """Run markdownlint-cli2 on a markdown file and return the output"""
+_RE_LINT_LINE = re.compile(r'^(.+?):(\d+(?::\d+)?) (MD\d+.*)$')
+_RE_LINT_RULE = re.compile(r'\b(MD\d+)/')
+
+def _match_lint_path(printed_path, file_paths):
+    """Map a path printed by markdownlint-cli2 back to one of the requested file paths"""
+    if printed_path in file_paths:
+        return printed_path
+    for file_path in file_paths:
+        if os.path.normpath(printed_path) == os.path.normpath(file_path) or \
+                os.path.abspath(printed_path) == os.path.abspath(file_path):
+            return file_path
+    return None
+
+def run_markdownlint_files(file_paths):
+    """Run markdownlint-cli2 once on several markdown files and return the output per file
+    
+    A single invocation avoids paying the Node.js startup cost for every file.
+    Each file's output lists its errors as "line:column rule description" (file path
+    removed to help GPT focus on line:column numbers, MD013 excluded) followed by a
+    "Summary: N error(s)" line.
+    """
+    file_paths = list(file_paths)
+    if not file_paths:
+        return {}
+    
     try:
         result = subprocess.run(
-            ['markdownlint-cli2', file_path],
+            ['markdownlint-cli2', *file_paths],
             capture_output=True,
             text=True
         )
-        
-        output = result.stdout + result.stderr
-        
-        # Filter out MD013 errors from the output
-        filtered_lines = []
-        md013_count = 0
-        
-        for line in output.split('\n'):
-            if 'MD013/line-length' in line:
-                md013_count += 1
-                continue  # Skip MD013 lines
-            filtered_lines.append(line)
-        
-        # Update the summary to reflect filtered count
-        filtered_output = '\n'.join(filtered_lines)
-        
-        # Update error count in summary
-        if 'Summary:' in filtered_output:
-            import re
-            summary_pattern = r'Summary: (\d+) error\(s\)'
-            match = re.search(summary_pattern, filtered_output)
-            if match:
-                original_count = int(match.group(1))
-                new_count = original_count - md013_count
-                filtered_output = re.sub(
-                    summary_pattern, 
-                    f'Summary: {new_count} error(s)', 
-                    filtered_output
-                )
-        
-        # Remove file path from error lines to help GPT focus on line:column numbers
-        import re
-        # Replace "filepath:line:column" with just "line:column"
-        filtered_output = re.sub(r'^[^:]+\.md:(\d+(?::\d+)?)', r'\1', filtered_output, flags=re.MULTILINE)
-        
-        return filtered_output
     except FileNotFoundError:
-        return "Error: markdownlint-cli2 not found. Please install it with: npm install -g markdownlint-cli2"
+        error = "Error: markdownlint-cli2 not found. Please install it with: npm install -g markdownlint-cli2"
+        return {file_path: error for file_path in file_paths}
     except Exception as e:
-        return f"Error running markdownlint: {str(e)}"
+        error = f"Error running markdownlint: {str(e)}"
+        return {file_path: error for file_path in file_paths}
+    
+    # Group error lines by the file path prefix
+    errors_by_file = {file_path: [] for file_path in file_paths}
+    for line in (result.stdout + result.stderr).split('\n'):
+        if 'MD013/line-length' in line:
+            continue  # Skip MD013 lines
+        match = _RE_LINT_LINE.match(line)
+        if not match:
+            continue
+        file_path = _match_lint_path(match.group(1), file_paths)
+        if file_path is not None:
+            errors_by_file[file_path].append(f"{match.group(2)} {match.group(3)}")
+    
+    return {
+        file_path: '\n'.join(errors + [f'Summary: {len(errors)} error(s)'])
+        for file_path, errors in errors_by_file.items()
+    }
+
+def run_markdownlint(file_path):
+    """Run markdownlint-cli2 on a markdown file and return the output"""
+    return run_markdownlint_files([file_path])[file_path]
 
 def parse_markdown_with_frontmatter(content):
     """Parse markdown file to separate frontmatter and content"""
@@ -85,21 +105,15 @@ def read_markdown_file(file_path):
     except Exception as e:
         return f"Error reading file: {str(e)}"
 
-def fix_markdown_with_openai(markdown_content, markdownlint_output, client):
-    """Use OpenAI gpt-4o-mini to fix markdown based on markdownlint output"""
-    
-    # Include the original content directly in the prompt
-    prompt = f"""다음은 markdownlint-cli2의 출력과 원본 마크다운 파일 내용입니다.
+def has_lint_errors(markdownlint_output):
+    """Check whether markdownlint output reports any errors"""
+    return not ("Summary: 0 error(s)" in markdownlint_output or ("error(s)" not in markdownlint_output and "Summary:" not in markdownlint_output))
 
-markdownlint-cli2 출력:
-```
-{markdownlint_output}
-```
-
-원본 마크다운 파일 내용:
-```markdown
-{markdown_content}
-```
+# Invariant instructions live in the system message so every request shares a
+# byte-identical prefix, which lets OpenAI's automatic prompt caching reuse it.
+# The always-sent common guides follow the base text, and rule-specific guides come
+# last so pruning them keeps the whole shared prefix intact.
+_FIX_SYSTEM_BASE = """You are a helpful assistant that fixes markdown formatting issues based on markdownlint output. You MUST preserve ALL original content completely without any truncation or summarization. You MUST include the complete file content in your response, never shorten anything. You MUST preserve YAML frontmatter exactly as it appears in the original file. Your response should be as long as or longer than the original file. IMPORTANT: Also fix markdown emphasis spacing and financial term spacing - ensure space/punctuation before ** opening marker, NO space after ** closing marker when text follows, and fix financial terms like 'S &P 500' to 'S&P 500', 'M &A' to 'M&A', etc.
 
 markdownlint 출력에서 각 오류는 다음 형식으로 표시됩니다:
 - 라인번호:컬럼번호 오류코드/오류명 설명 [상세정보] [컨텍스트: "해당 텍스트"]
@@ -107,7 +121,7 @@ markdownlint 출력에서 각 오류는 다음 형식으로 표시됩니다:
 예: `8 MD022/blanks-around-headings`는 8번째 줄에 제목 주변 공백 문제가 있음을 의미합니다.
 `196:1 MD007/ul-indent`는 196번째 줄 1번째 컬럼에 리스트 들여쓰기 문제가 있음을 의미합니다.
 
-위의 원본 파일 내용을 참조하여 다음 규칙을 따라 수정해주세요:
+사용자가 보낸 원본 파일 내용을 참조하여 다음 규칙을 따라 수정해주세요:
 
 **매우 중요한 규칙:**
 1. 모든 markdownlint 오류를 정확히 수정해야 합니다 (MD013 line-length 오류는 이미 제외되어 있음)
@@ -120,12 +134,21 @@ markdownlint 출력에서 각 오류는 다음 형식으로 표시됩니다:
 8. 원본 파일의 길이와 동일하거나 더 긴 결과를 제공해야 합니다
 
 **특정 오류 유형에 대한 수정 지침:**
-- **MD036 (emphasis used instead of heading)**: 볼드체(**텍스트**)나 이탤릭체(*텍스트*)로 된 텍스트가 제목처럼 사용된 경우, 적절한 제목 레벨(#, ##, ### 등)로 변경하세요. 특히 다음 패턴들을 주의하세요:
+"""
+
+# Guidance for specific markdownlint rules, only sent when the rule fires
+_FIX_RULE_GUIDES = {
+    "MD036": """- **MD036 (emphasis used instead of heading)**: 볼드체(**텍스트**)나 이탤릭체(*텍스트*)로 된 텍스트가 제목처럼 사용된 경우, 적절한 제목 레벨(#, ##, ### 등)로 변경하세요. 특히 다음 패턴들을 주의하세요:
   - "**◼︎ 텍스트**" 형태 → "### ◼︎ 텍스트" 또는 "#### ◼︎ 텍스트"로 변경
   - "**그림 설명: ...**" 형태 → "#### 그림 설명: ..."로 변경  
   - 섹션 구분자 역할을 하는 모든 볼드 텍스트를 적절한 헤딩 레벨로 변경
-- **MD047 (single trailing newline)**: 파일이 반드시 하나의 빈 줄로 끝나야 합니다. 파일 끝에 정확히 하나의 개행 문자만 있도록 하세요
-- **마크다운 강조 기호 띄어쓰기 규칙**: 마크다운 강조 기호(** 또는 *)의 앞뒤 띄어쓰기를 올바르게 수정하세요:
+""",
+    "MD047": """- **MD047 (single trailing newline)**: 파일이 반드시 하나의 빈 줄로 끝나야 합니다. 파일 끝에 정확히 하나의 개행 문자만 있도록 하세요
+""",
+}
+
+# Guidance for content issues markdownlint does not report, always sent
+_FIX_COMMON_GUIDES = """- **마크다운 강조 기호 띄어쓰기 규칙**: 마크다운 강조 기호(** 또는 *)의 앞뒤 띄어쓰기를 올바르게 수정하세요:
   - 잘못된 예: `밝혔습니다.**베트남은 완전 개방을 약속** 했습니다.`
   - 올바른 예: `밝혔습니다. **베트남은 완전 개방을 약속**했습니다.` 
   - 핵심 규칙: 
@@ -140,29 +163,124 @@ markdownlint 출력에서 각 오류는 다음 형식으로 표시됩니다:
   - `AI &머신러닝` → `AI & 머신러닝` (한국어와 결합 시 &는 유지)
   - `GDP &경제성장` → `GDP & 경제성장`
   - 일반 규칙: 영문 약어에서 &(앰퍼샌드) 앞뒤의 불필요한 공백 제거
+"""
 
+@functools.lru_cache(maxsize=None)
+def build_fix_system(rules=None):
+    """Build the system message, keeping only the rule guides for rules in `rules` (a frozenset; None keeps all)"""
+    guides = "".join(guide for rule, guide in _FIX_RULE_GUIDES.items() if rules is None or rule in rules)
+    return _FIX_SYSTEM_BASE + _FIX_COMMON_GUIDES + guides
+
+def lint_rules(markdownlint_output):
+    """Return the set of markdownlint rule codes (e.g. MD036) reported in the output"""
+    return frozenset(match.group(1) for match in _RE_LINT_RULE.finditer(markdownlint_output))
+
+_FIX_USER_TEMPLATE = """다음은 markdownlint-cli2의 출력과 원본 마크다운 파일 내용입니다.
+
+markdownlint-cli2 출력:
+```
+{lint}
+```
+
+원본 마크다운 파일 내용:
+```markdown
+{content}
+```
+
+위의 원본 파일 내용을 시스템 메시지의 규칙에 따라 수정해주세요.
 응답에는 **완전한 전체** 마크다운 파일 내용을 포함해주세요. 절대로 내용을 생략하거나 축약하지 마세요."""
 
+def build_fix_request(markdown_content, markdownlint_output, rules=None):
+    """Build the chat completion request body used to fix a markdown file
+    
+    `rules` is the set of markdownlint rules whose guides go into the system message;
+    it defaults to the rules reported for this file.
+    """
+    if rules is None:
+        rules = lint_rules(markdownlint_output)
+    
+    # Include the original content directly in the prompt
+    prompt = _FIX_USER_TEMPLATE.format(lint=markdownlint_output, content=markdown_content)
+
     # save prompt to a file for debugging
     # with open('debug_prompt.txt', 'w', encoding='utf-8') as debug_file:
     #     debug_file.write(prompt)
     
+    return {
+        "model": "gpt-4o-mini",
+        "messages": [
+            {"role": "system", "content": build_fix_system(rules)},
+            {"role": "user", "content": prompt}
+        ],
+        "max_tokens": 16000,  # Use gpt-4o-mini which has better capacity
+        "temperature": 0.1
+    }
+
+async def fix_markdown_with_openai(markdown_content, markdownlint_output, client, worker, cache=None, rules=None):
+    """Use OpenAI gpt-4o-mini to fix markdown based on markdownlint output, paced by the rate-limit worker"""
+    request = build_fix_request(markdown_content, markdownlint_output, rules)
+    
+    # Return the cached response for identical requests
+    cache_key = None
+    if cache is not None:
+        system_message, user_message = (message["content"] for message in request["messages"])
+        cache_key = cache.make_key(request["model"], system_message, user_message)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            print("Using cached OpenAI response")
+            return cached
+    
+    token_cost = worker.estimate_tokens(
+        *(message["content"] for message in request["messages"]),
+        completion_tokens=request["max_tokens"]
+    )
+    
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini", 
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant that fixes markdown formatting issues based on markdownlint output. You MUST preserve ALL original content completely without any truncation or summarization. You MUST include the complete file content in your response, never shorten anything. You MUST preserve YAML frontmatter exactly as it appears in the original file. Your response should be as long as or longer than the original file. IMPORTANT: Also fix markdown emphasis spacing and financial term spacing - ensure space/punctuation before ** opening marker, NO space after ** closing marker when text follows, and fix financial terms like 'S &P 500' to 'S&P 500', 'M &A' to 'M&A', etc."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=16000,  # Use gpt-4o-mini which has better capacity
-            temperature=0.1
-        )
+        response = await worker.submit(lambda: client.chat.completions.create(**request), token_cost)
         
-        return response.choices[0].message.content.strip()
+        fixed_content = response.choices[0].message.content.strip()
+        if cache_key is not None:
+            cache.set(cache_key, fixed_content)
+        return fixed_content
         
     except Exception as e:
         return f"Error calling OpenAI API: {str(e)}"
 
+def clean_fixed_content(fixed_content):
+    """Strip code block markers from a model response and ensure a single trailing newline"""
+    # Remove potential code block markers from response
+    if fixed_content.startswith("```markdown"):
+        fixed_content = fixed_content[11:]
+    if fixed_content.startswith("```"):
+        fixed_content = fixed_content[3:]
+    if fixed_content.endswith("```"):
+        fixed_content = fixed_content[:-3]
+    
+    fixed_content = fixed_content.strip()
+    
+    # Fix MD047: Ensure file ends with exactly one newline
+    return fixed_content.rstrip() + '\n'
+
+def write_file_atomic(file_path, content):
+    """Write content to a sibling temp file and swap it into place, so a failed write never leaves a truncated file
+    
+    Symlinks are written through to their target, and the target's permissions are kept.
+    """
+    target_path = os.path.realpath(file_path)
+    tmp_path = f"{target_path}.tmp"
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        if os.path.exists(target_path):
+            shutil.copymode(target_path, tmp_path)
+        os.replace(tmp_path, target_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
 def save_fixed_file(original_path, fixed_content):
     """Save the fixed markdown to a new file with _fix suffix"""
     original_file = Path(original_path)
@@ -170,23 +288,288 @@ def save_fixed_file(original_path, fixed_content):
     fixed_file = original_file
     
     try:
-        with open(fixed_file, 'w', encoding='utf-8') as f:
-            f.write(fixed_content)
+        write_file_atomic(fixed_file, fixed_content)
         return str(fixed_file)
     except Exception as e:
         return f"Error saving file: {str(e)}"
 
+def submit_batch(file_paths, client):
+    """Submit fix requests for all files with lint errors as one OpenAI Batch API job.
+    
+    Returns the batch id, or None when no file needs fixing.
+    """
+    # custom_id must be unique within a batch
+    file_paths = list(dict.fromkeys(file_paths))
+    lint_outputs = run_markdownlint_files(file_paths)
+    
+    # Share one system message across the batch, listing only rules that fire somewhere in it
+    corpus_rules = frozenset().union(*(lint_rules(output) for output in lint_outputs.values()))
+    
+    with tempfile.NamedTemporaryFile('w', suffix='.jsonl', encoding='utf-8', delete=False) as batch_file:
+        batch_input_path = batch_file.name
+        request_count = 0
+        for file_path in file_paths:
+            markdownlint_output = lint_outputs[file_path]
+            if "Error:" in markdownlint_output:
+                print(f"Skipping {file_path}: {markdownlint_output}")
+                continue
+            if not has_lint_errors(markdownlint_output):
+                print(f"Skipping {file_path}: no markdownlint errors found")
+                continue
+            
+            markdown_content = read_markdown_file(file_path)
+            if markdown_content.startswith("Error:"):
+                print(f"Skipping {file_path}: {markdown_content}")
+                continue
+            
+            batch_file.write(json.dumps({
+                "custom_id": file_path,
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": build_fix_request(markdown_content, markdownlint_output, corpus_rules)
+            }, ensure_ascii=False) + '\n')
+            request_count += 1
+    
+    try:
+        if request_count == 0:
+            return None
+        
+        print(f"Uploading batch input with {request_count} request(s)...")
+        with open(batch_input_path, 'rb') as f:
+            input_file = client.files.create(file=f, purpose="batch")
+        batch = client.batches.create(
+            input_file_id=input_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h"
+        )
+        return batch.id
+    finally:
+        os.unlink(batch_input_path)
+
+def wait_for_batch(batch_id, client, poll_interval=30):
+    """Poll a batch job until it reaches a terminal status and return it"""
+    while True:
+        batch = client.batches.retrieve(batch_id)
+        counts = batch.request_counts
+        progress = f" ({counts.completed}/{counts.total})" if counts else ""
+        print(f"Batch {batch_id}: {batch.status}{progress}")
+        if batch.status in ("completed", "failed", "expired", "cancelled"):
+            return batch
+        time.sleep(poll_interval)
+
+def _read_batch_file(client, file_id):
+    """Yield the JSON records of a batch output or error file"""
+    if not file_id:
+        return
+    for line in client.files.content(file_id).text.splitlines():
+        if line.strip():
+            yield json.loads(line)
+
+def apply_batch_results(batch, client):
+    """Save each batch response back to the file named by its custom_id.
+    
+    Requests that failed (listed in the batch's error file or with a non-200
+    response in the output file) are reported by custom_id.
+    Returns the list of file paths that were saved.
+    """
+    saved_paths = []
+    failed_paths = []
+    
+    for result in _read_batch_file(client, batch.output_file_id):
+        file_path = result.get("custom_id")
+        response = result.get("response") or {}
+        if result.get("error") or response.get("status_code") != 200:
+            print(f"Error: batch request failed for {file_path}: {result.get('error') or response.get('body')}")
+            failed_paths.append(file_path)
+            continue
+        
+        # A malformed or empty response (e.g. a refusal with null content) only fails its own file
+        try:
+            fixed_content = response["body"]["choices"][0]["message"]["content"]
+            if not fixed_content:
+                raise ValueError("empty response content")
+            fixed_file_path = save_fixed_file(file_path, clean_fixed_content(fixed_content.strip()))
+        except Exception as e:
+            print(f"Error: could not apply batch result for {file_path}: {e}")
+            failed_paths.append(file_path)
+            continue
+        if fixed_file_path.startswith("Error"):
+            print(fixed_file_path)
+            failed_paths.append(file_path)
+            continue
+        print(f"Fixed file saved as: {fixed_file_path}")
+        saved_paths.append(fixed_file_path)
+    
+    for result in _read_batch_file(client, batch.error_file_id):
+        file_path = result.get("custom_id")
+        response = result.get("response") or {}
+        print(f"Error: batch request failed for {file_path}: {result.get('error') or response.get('body')}")
+        failed_paths.append(file_path)
+    
+    if failed_paths:
+        print(f"{len(failed_paths)} batch request(s) failed: {', '.join(str(path) for path in failed_paths)}")
+    
+    return saved_paths
+
+def run_batch(file_paths, client, poll_interval):
+    """Fix multiple files through the OpenAI Batch API (50% cost, up to 24h turnaround)"""
+    batch_id = submit_batch(file_paths, client)
+    if batch_id is None:
+        print("No markdownlint errors found. Files are already properly formatted.")
+        return
+    
+    print(f"Submitted batch: {batch_id}")
+    batch = wait_for_batch(batch_id, client, poll_interval)
+    if batch.status != "completed":
+        print(f"Error: batch {batch_id} ended with status {batch.status}")
+        sys.exit(1)
+    
+    saved_paths = apply_batch_results(batch, client)
+    
+    # Verify the fixes by running markdownlint again
+    print("Verifying fixes...")
+    verification_outputs = run_markdownlint_files(saved_paths)
+    for fixed_file_path, verification_output in verification_outputs.items():
+        if has_lint_errors(verification_output):
+            print(f"Warning: Some errors may still remain in {fixed_file_path}:")
+            print(verification_output)
+        else:
+            print(f"✅ {fixed_file_path}: all markdownlint errors have been fixed!")
+
+def find_markdown_files(directory):
+    """Recursively find markdown files in a directory, skipping hidden directories"""
+    markdown_files = []
+    for root, dirs, names in os.walk(directory):
+        dirs[:] = [d for d in dirs if not d.startswith('.')]
+        for name in names:
+            if name.endswith(('.md', '.markdown')):
+                markdown_files.append(os.path.join(root, name))
+    return sorted(markdown_files)
+
+async def _lint_in_pool(pool, file_paths):
+    """Lint files in parallel worker processes, yielding (path, output) as each group finishes"""
+    loop = asyncio.get_running_loop()
+    group_count = min(len(file_paths), os.cpu_count() or 1)
+    groups = [file_paths[i::group_count] for i in range(group_count)]
+    futures = [loop.run_in_executor(pool, run_markdownlint_files, group) for group in groups]
+    for future in asyncio.as_completed(futures):
+        for file_path, output in (await future).items():
+            yield file_path, output
+
+async def fix_file(file_path, markdownlint_output, client, worker, cache=None):
+    """Fix one markdown file and save it in place. Returns the saved path, or None on failure"""
+    markdown_content = read_markdown_file(file_path)
+    if markdown_content.startswith("Error"):
+        print(f"{file_path}: {markdown_content}")
+        return None
+    
+    fixed_content = await fix_markdown_with_openai(markdown_content, markdownlint_output, client, worker, cache)
+    if fixed_content.startswith("Error"):
+        print(f"{file_path}: {fixed_content}")
+        return None
+    
+    fixed_file_path = save_fixed_file(file_path, clean_fixed_content(fixed_content))
+    if fixed_file_path.startswith("Error"):
+        print(f"{file_path}: {fixed_file_path}")
+        return None
+    
+    print(f"Fixed file saved as: {fixed_file_path}")
+    return fixed_file_path
+
+async def run_directory(file_paths, client, worker, cache=None, concurrency=8):
+    """Fix many files, overlapping markdownlint runs (process pool) with OpenAI calls (asyncio)
+    
+    Lint results are queued as soon as each process finishes so that LLM requests
+    start before the whole directory has been linted.
+    """
+    queue = asyncio.Queue()
+    saved_paths = []
+    
+    with ProcessPoolExecutor() as pool:
+        async def lint_stage():
+            try:
+                async for file_path, markdownlint_output in _lint_in_pool(pool, file_paths):
+                    if markdownlint_output.startswith("Error"):
+                        print(f"Skipping {file_path}: {markdownlint_output}")
+                    elif not has_lint_errors(markdownlint_output):
+                        print(f"Skipping {file_path}: no markdownlint errors found")
+                    else:
+                        await queue.put((file_path, markdownlint_output))
+            finally:
+                # One stop signal per fix worker
+                for _ in range(concurrency):
+                    await queue.put(None)
+        
+        async def fix_stage():
+            while True:
+                item = await queue.get()
+                if item is None:
+                    return
+                file_path, markdownlint_output = item
+                print(f"Fixing {file_path}...")
+                fixed_file_path = await fix_file(file_path, markdownlint_output, client, worker, cache)
+                if fixed_file_path:
+                    saved_paths.append(fixed_file_path)
+        
+        await asyncio.gather(lint_stage(), *(fix_stage() for _ in range(concurrency)))
+        
+        # Verify the fixes by running markdownlint again
+        if saved_paths:
+            print("Verifying fixes...")
+            async for fixed_file_path, verification_output in _lint_in_pool(pool, saved_paths):
+                if has_lint_errors(verification_output):
+                    print(f"Warning: Some errors may still remain in {fixed_file_path}:")
+                    print(verification_output)
+                else:
+                    print(f"✅ {fixed_file_path}: all markdownlint errors have been fixed!")
+    
+    print(f"Fixed {len(saved_paths)} of {len(file_paths)} file(s)")
+    return saved_paths
+
 def main():
     parser = argparse.ArgumentParser(description='Fix markdown files using OpenAI gpt-4o-mini based on markdownlint-cli2 output')
-    parser.add_argument('markdown_file', help='Path to the markdown file to fix')
+    parser.add_argument('markdown_files', nargs='*', help='Path to the markdown file to fix (multiple files require --batch or --dir)')
     parser.add_argument('--api-key', help='OpenAI API key (or set OPENAI_API_KEY environment variable)')
     parser.add_argument('--model', default='gpt-4o-mini', help='OpenAI model to use (default: gpt-4o-mini)')
+    parser.add_argument('--rpm', type=float, default=500, help='Max requests per minute (default: 500)')
+    parser.add_argument('--tpm', type=float, default=200000, help='Max tokens per minute (default: 200000)')
+    parser.add_argument('--batch', action='store_true', help='Submit all files as one OpenAI Batch API job (50%% cost, up to 24h turnaround)')
+    parser.add_argument('--cache-path', default=DEFAULT_CACHE_PATH, help=f'Response cache database path (default: {DEFAULT_CACHE_PATH})')
+    parser.add_argument('--no-cache', action='store_true', help='Disable the response cache')
+    parser.add_argument('--poll-interval', type=int, default=30, help='Seconds between batch status checks (default: 30)')
+    
+    directory_group = parser.add_argument_group('directory mode')
+    directory_group.add_argument('--dir', help='Fix every markdown file under this directory')
+    directory_group.add_argument('--concurrency', type=int, default=8, help='Number of concurrent OpenAI requests in --dir mode (default: 8)')
     
     args = parser.parse_args()
     
-    # Check if file exists
-    if not os.path.exists(args.markdown_file):
-        print(f"Error: File {args.markdown_file} does not exist")
+    if not args.markdown_files and not args.dir:
+        parser.error('either markdown_files or --dir is required')
+    
+    if args.dir:
+        if not os.path.isdir(args.dir):
+            print(f"Error: Directory {args.dir} does not exist")
+            sys.exit(1)
+        args.markdown_files.extend(find_markdown_files(args.dir))
+        if not args.markdown_files:
+            print(f"No markdown files found in {args.dir}")
+            sys.exit(0)
+    
+    # A file given explicitly and also found under --dir is processed once
+    unique_files = {}
+    for markdown_file in args.markdown_files:
+        unique_files.setdefault(os.path.realpath(markdown_file), markdown_file)
+    args.markdown_files = list(unique_files.values())
+    
+    # Check if files exist
+    for markdown_file in args.markdown_files:
+        if not os.path.exists(markdown_file):
+            print(f"Error: File {markdown_file} does not exist")
+            sys.exit(1)
+    
+    if len(args.markdown_files) > 1 and not (args.batch or args.dir):
+        print("Error: Multiple files can only be processed with --batch or --dir")
         sys.exit(1)
     
     # Set up OpenAI client
@@ -195,20 +578,35 @@ def main():
         print("Error: OpenAI API key not provided. Use --api-key or set OPENAI_API_KEY environment variable")
         sys.exit(1)
     
-    client = OpenAI(api_key=api_key)
+    if args.batch:
+        run_batch(args.markdown_files, OpenAI(api_key=api_key), args.poll_interval)
+        return
+    
+    # Retries are handled by the rate-limit worker
+    client = AsyncOpenAI(api_key=api_key, max_retries=0, http_client=make_async_http_client())
+    worker = AsyncOpenAIWorker(max_requests_per_minute=args.rpm, max_tokens_per_minute=args.tpm,
+                               max_in_flight=args.concurrency)
+    cache = None if args.no_cache else LLMCache(args.cache_path)
+    
+    if args.dir:
+        print(f"Processing {len(args.markdown_files)} file(s) in {args.dir}")
+        asyncio.run(run_directory(args.markdown_files, client, worker, cache, args.concurrency))
+        return
+    
+    markdown_file = args.markdown_files[0]
     
-    print(f"Processing: {args.markdown_file}")
+    print(f"Processing: {markdown_file}")
     
     # Run markdownlint
     print("Running markdownlint-cli2...")
-    markdownlint_output = run_markdownlint(args.markdown_file)
+    markdownlint_output = run_markdownlint(markdown_file)
     
     if "Error:" in markdownlint_output:
         print(markdownlint_output)
         sys.exit(1)
     
     # Check if there are any errors to fix
-    if "Summary: 0 error(s)" in markdownlint_output or ("error(s)" not in markdownlint_output and "Summary:" not in markdownlint_output):
+    if not has_lint_errors(markdownlint_output):
         print("No markdownlint errors found. File is already properly formatted.")
         sys.exit(0)
     
@@ -216,7 +614,7 @@ def main():
     
     # Read original file
     print("Reading original markdown file...")
-    markdown_content = read_markdown_file(args.markdown_file)
+    markdown_content = read_markdown_file(markdown_file)
     
     if markdown_content.startswith("Error:"):
         print(markdown_content)
@@ -229,28 +627,17 @@ def main():
     
     # Fix markdown using OpenAI
     print("Fixing markdown with OpenAI...")
-    fixed_content = fix_markdown_with_openai(markdown_content, markdownlint_output, client)
+    fixed_content = asyncio.run(fix_markdown_with_openai(markdown_content, markdownlint_output, client, worker, cache))
     
     if fixed_content.startswith("Error:"):
         print(fixed_content)
         sys.exit(1)
     
-    # Remove potential code block markers from response
-    if fixed_content.startswith("```markdown"):
-        fixed_content = fixed_content[11:]
-    if fixed_content.startswith("```"):
-        fixed_content = fixed_content[3:]
-    if fixed_content.endswith("```"):
-        fixed_content = fixed_content[:-3]
-    
-    fixed_content = fixed_content.strip()
-    
-    # Fix MD047: Ensure file ends with exactly one newline
-    fixed_content = fixed_content.rstrip() + '\n'
+    fixed_content = clean_fixed_content(fixed_content)
     
     # Save fixed file
     print("Saving fixed file...")
-    fixed_file_path = save_fixed_file(args.markdown_file, fixed_content)
+    fixed_file_path = save_fixed_file(markdown_file, fixed_content)
     
     if fixed_file_path.startswith("Error:"):
         print(fixed_file_path)
@@ -262,7 +649,7 @@ def main():
     print("Verifying fix...")
     verification_output = run_markdownlint(fixed_file_path)
     
-    if "error(s)" in verification_output:
+    if has_lint_errors(verification_output):
         print("Warning: Some errors may still remain:")
         print(verification_output)
     else:
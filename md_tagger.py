@@ -9,15 +9,144 @@ Ollama의 qwen3:30b-32k-0.0 모델을 사용하여 마크다운 파일을 분석
 import os
 import re
 import yaml
+import asyncio
+import hashlib
+import shutil
+import functools
 import json
 import argparse
-from pathlib import Path
+from collections import Counter
 from typing import List, Dict, Optional, Tuple
+import aiofiles
 import ollama
 import tiktoken
+from llm_cache import LLMCache, DEFAULT_CACHE_PATH
+
+_RE_THINK = re.compile(r'<think>.*?</think>', re.DOTALL)
+_RE_ANSWER = re.compile(r'<answer>.*?</answer>', re.DOTALL)
+_RE_REASONING = re.compile(r'<reasoning>.*?</reasoning>', re.DOTALL)
+_RE_TAG = re.compile(r'<[^>]+>')
+_RE_BATCH_HASHTAGS = re.compile(r"\*\*해시태그\s*(\d+):\*\*([^*]+)")
+_HANGUL_RE = re.compile('[\uac00-\ud7a3]')
+_WHITESPACE_TRANS = str.maketrans('', '', ' _')
+
+# 프롬프트 지시문 등 청크 외 입력에 확보할 토큰 수
+_PROMPT_OVERHEAD_TOKENS = 1024
+
+
+def _estimate_tokens(text: str) -> int:
+    """
+    tiktoken 없이 토큰 수를 근사합니다.
+    
+    한글은 글자당 1토큰 이상으로 인코딩되므로 한글 1글자를 1토큰으로, 나머지는 3글자를 1토큰으로 셉니다.
+    (청크가 num_ctx를 넘지 않도록 적게 세지 않는 쪽으로 근사)
+    """
+    hangul = _HANGUL_RE.subn('', text)[1]
+    return hangul + (len(text) - hangul) // 3
+
+
+@functools.lru_cache(maxsize=4)
+def _get_encoding(name: str) -> tiktoken.Encoding:
+    """tiktoken 인코딩을 이름별로 한 번만 생성합니다."""
+    return tiktoken.get_encoding(name)
+
+
+# 문서 유형별 프롬프트 설정 (요약 분량, 태그 작성 지침, 응답 형식 예시 태그)
+_PROMPT_PROFILES = {
+    "general": ("3-5문장", "", ("머신러닝", "데이터분석", "인공지능", "딥러닝", "파이썬프로그래밍")),
+    "blog": ("2-3문장", "글의 주제와 독자가 검색할 만한 키워드를 우선해주세요.",
+             ("여행기", "맛집추천", "제품리뷰", "개발후기", "생산성")),
+    "note": ("1-2문장", "노트에 등장하는 개념과 용어를 우선해주세요.",
+             ("회의록", "독서노트", "프로젝트관리", "아이디어", "할일정리")),
+    "paper": ("3-5문장", "연구 분야, 방법론, 핵심 개념을 나타내는 태그를 우선해주세요.",
+              ("자연어처리", "강화학습", "실험설계", "선행연구", "벤치마크")),
+}
+
+# 문서 유형을 판별하는 프론트매터 키 (앞에 있는 유형이 우선)
+_SCHEMA_KEYS = (
+    ("paper", frozenset({"doi", "authors", "journal", "abstract", "arxiv", "venue", "citation"})),
+    ("blog", frozenset({"slug", "draft", "categories", "author", "description", "permalink", "published"})),
+    ("note", frozenset({"aliases", "cssclass", "cssclasses", "created", "updated", "id"})),
+)
+
+
+@functools.lru_cache(maxsize=None)
+def _select_prompt_profile(schema_signature: frozenset) -> str:
+    """프론트매터 키 집합으로 사용할 프롬프트 유형을 고릅니다."""
+    keys = {str(key).lower() for key in schema_signature}
+    for profile, hint_keys in _SCHEMA_KEYS:
+        if keys & hint_keys:
+            return profile
+    return "general"
+
+
+@functools.lru_cache(maxsize=None)
+def _build_prompt_templates(profile: str) -> Tuple[str, str]:
+    """
+    유형에 맞춘 (단일 청크, 배치) 프롬프트 템플릿을 생성합니다.
+    
+    단일 템플릿은 {chunk}, 배치 템플릿은 {count}, {sections} 자리를 채워 사용합니다.
+    """
+    summary_length, focus, examples = _PROMPT_PROFILES[profile]
+    focus_line = f"{focus}\n" if focus else ""
+    single = f"""다음 텍스트를 분석하여 먼저 요약본을 만들고, 그 요약본을 바탕으로 해시태그를 생성해주세요.
+
+1단계: 텍스트 요약
+이 텍스트의 핵심 내용을 {summary_length}으로 요약해주세요.
+
+2단계: 해시태그 생성  
+요약본을 바탕으로 적절한 해시태그를 생성해주세요. 해시태그는 반드시 한글로 작성해주세요.
+각 해시태그는 한 줄에 하나씩 작성해주세요.
+태그에는 '#', '_' 기호나 띄어쓰기를 넣지 마세요. 모든 단어를 붙여서 작성해주세요.
+{focus_line}
+텍스트:
+{{chunk}}
+
+응답 형식:
+**요약:**
+[여기에 요약 내용 작성]
+
+**해시태그:**
+""" + "\n".join(examples)
+    batch = f"""다음 {{count}}개의 텍스트 청크를 각각 분석하여 먼저 요약본을 만들고, 그 요약본을 바탕으로 해시태그를 생성해주세요.
+
+1단계: 텍스트 요약
+각 청크의 핵심 내용을 {summary_length}으로 요약해주세요.
+
+2단계: 해시태그 생성  
+각 요약본을 바탕으로 적절한 해시태그를 생성해주세요. 해시태그는 반드시 한글로 작성해주세요.
+각 해시태그는 한 줄에 하나씩 작성해주세요.
+태그에는 '#', '_' 기호나 띄어쓰기를 넣지 마세요. 모든 단어를 붙여서 작성해주세요.
+{focus_line}청크 번호마다 요약과 해시태그를 따로 작성해주세요.
+
+텍스트:
+{{sections}}
+
+응답 형식:
+**요약 1:**
+[1번 청크 요약 내용 작성]
+
+**해시태그 1:**
+""" + "\n".join(examples[:3]) + """
+
+**요약 2:**
+[2번 청크 요약 내용 작성]
+
+**해시태그 2:**
+""" + "\n".join(examples[3:])
+    return single, batch
+
+
+def _encoding_name_for_model(model_name: str) -> str:
+    """모델에 가까운 토크나이저를 고릅니다. (qwen 모델은 o200k_base가 더 가까움)"""
+    return "o200k_base" if model_name.startswith("qwen") else "cl100k_base"
+
 
 class MarkdownTagger:
-    def __init__(self, model_name: str = "qwen3:30b-32k-0.0", max_tokens: int = 4096, chunk_size: int = 2048):
+    def __init__(self, model_name: str = "qwen3:30b-32k-0.0", max_tokens: int = 4096, chunk_size: int = 2048,
+                 concurrency: int = 4, file_concurrency: int = 4, cache: Optional[LLMCache] = None,
+                 batch_size: int = 5, num_predict: int = 2048, force: bool = False,
+                 fast_tokenize: bool = False, schema_detect: int = 0):
         """
         마크다운 태거 초기화
         
@@ -25,70 +154,108 @@ class MarkdownTagger:
             model_name: Ollama 모델 이름
             max_tokens: 모델 최대 토큰 수
             chunk_size: 텍스트 청킹 크기
+            concurrency: 파일당 동시에 보낼 Ollama 요청 수
+            file_concurrency: 디렉토리 모드에서 동시에 처리할 파일 수
+            cache: LLM 응답 캐시 (None이면 캐시 사용 안 함)
+            batch_size: 한 요청에 묶어 보낼 최대 청크 수 (청크는 chunk_size // batch_size 크기로 분할)
+            num_predict: 요청당 최대 생성 토큰 수
+            force: 내용이 바뀌지 않은 파일도 다시 태그 생성
+            fast_tokenize: tiktoken 대신 글자 수 기반 근사치(한글 글자 수 + 나머지 글자 수 // 3)로 토큰 수 계산
+            schema_detect: 처음 K개 파일의 프론트매터 키로 문서 유형을 판별해 프롬프트를 특화 (0이면 사용 안 함)
         """
         self.model_name = model_name
         self.max_tokens = max_tokens
         self.chunk_size = chunk_size
-        self.encoding = tiktoken.get_encoding("cl100k_base")  # GPT-4 기본 인코딩
+        self.concurrency = max(1, concurrency)
+        self.file_concurrency = max(1, file_concurrency)
+        self.cache = cache
+        self.batch_size = max(1, batch_size)
+        self.num_predict = num_predict
+        self.force = force
+        # 청크 크기에 맞춰 컨텍스트(KV 캐시) 크기를 고정 (모델 최대 토큰 수 이내)
+        # 요청마다 num_ctx가 같아야 Ollama가 모델을 다시 로드하지 않음
+        self.num_ctx = min(self.max_tokens, self.chunk_size + _PROMPT_OVERHEAD_TOKENS + self.num_predict)
+        self._client: Optional[ollama.AsyncClient] = None
+        self.fast_tokenize = fast_tokenize
+        self.encoding = None if fast_tokenize else _get_encoding(_encoding_name_for_model(model_name))
+        self.schema_detect = max(0, schema_detect)
+        # None이면 처리할 파일의 프론트매터로 판별
+        self.prompt_profile: Optional[str] = None if self.schema_detect else "general"
         
     def count_tokens(self, text: str) -> int:
         """텍스트의 토큰 수를 계산합니다."""
+        if self.fast_tokenize:
+            return _estimate_tokens(text)
         return len(self.encoding.encode(text))
     
+    def _count_tokens_batch(self, texts: List[str]) -> List[int]:
+        """여러 텍스트의 토큰 수를 한 번의 배치 인코딩으로 계산합니다."""
+        if self.fast_tokenize:
+            return [_estimate_tokens(text) for text in texts]
+        return [len(tokens) for tokens in self.encoding.encode_ordinary_batch(texts)]
+    
     def split_into_chunks(self, text: str, chunk_size: int) -> List[str]:
         """텍스트를 청크 크기에 맞게 효율적으로 분할합니다."""
+        return [chunk for chunk, _ in self._split_into_counted_chunks(text, chunk_size)]
+    
+    def _split_into_counted_chunks(self, text: str, chunk_size: int) -> List[Tuple[str, int]]:
+        """
+        텍스트를 청크로 분할하고 각 청크의 토큰 수를 함께 반환합니다.
+        
+        모든 라인을 한 번에 배치 인코딩한 뒤 라인별 토큰 수를 누적하므로
+        청크가 커질 때마다 전체를 다시 인코딩하지 않습니다.
+        """
         if text is None:
             return []
         
         chunks = []
-        current_chunk = ""
+        current_pieces = []
+        current_tokens = 0
+        
+        def flush():
+            chunk = "".join(current_pieces).strip()
+            if chunk:
+                chunks.append((chunk, current_tokens))
         
-        # 헤더 패턴으로 텍스트를 섹션으로 분할 (# ## ### #### ##### ######)
-        header_pattern = r'^(#{1,6})\s+(.+)$'
         lines = text.split('\n')
+        line_pieces = [line + "\n" for line in lines]
+        line_token_lens = self._count_tokens_batch(line_pieces)
         
-        for line in lines:
-            test_chunk = current_chunk + line + "\n"
-            
+        for line, piece, piece_tokens in zip(lines, line_pieces, line_token_lens):
             # 청크 크기 확인
-            if self.count_tokens(test_chunk) <= chunk_size:
-                current_chunk = test_chunk
-            else:
-                # 현재 청크가 비어있지 않으면 저장
-                if current_chunk.strip():
-                    chunks.append(current_chunk.strip())
-                
-                # 헤더인지 확인
-                header_match = re.match(header_pattern, line)
-                if header_match:
-                    # 헤더로 새 청크 시작
-                    current_chunk = line + "\n"
-                else:
-                    # 일반 라인으로 새 청크 시작
-                    current_chunk = line + "\n"
-                
-                # 단일 라인이 청크 크기를 초과하는 경우 강제로 분할
-                if self.count_tokens(current_chunk) > chunk_size:
-                    # 문장 단위로 분할 시도
-                    sentences = line.split('. ')
-                    current_chunk = ""
-                    for sentence in sentences:
-                        test_sentence = current_chunk + sentence + ". "
-                        if self.count_tokens(test_sentence) <= chunk_size:
-                            current_chunk = test_sentence
-                        else:
-                            if current_chunk.strip():
-                                chunks.append(current_chunk.strip())
-                            current_chunk = sentence + ". "
+            if current_tokens + piece_tokens <= chunk_size:
+                current_pieces.append(piece)
+                current_tokens += piece_tokens
+                continue
+            
+            # 현재 청크가 비어있지 않으면 저장하고 이 라인으로 새 청크 시작
+            flush()
+            current_pieces = [piece]
+            current_tokens = piece_tokens
+            
+            # 단일 라인이 청크 크기를 초과하는 경우 강제로 분할
+            if piece_tokens > chunk_size:
+                # 문장 단위로 분할 시도
+                sentence_pieces = [sentence + ". " for sentence in line.split('. ')]
+                sentence_token_lens = self._count_tokens_batch(sentence_pieces)
+                current_pieces = []
+                current_tokens = 0
+                for sentence_piece, sentence_tokens in zip(sentence_pieces, sentence_token_lens):
+                    if current_tokens + sentence_tokens <= chunk_size:
+                        current_pieces.append(sentence_piece)
+                        current_tokens += sentence_tokens
+                    else:
+                        flush()
+                        current_pieces = [sentence_piece]
+                        current_tokens = sentence_tokens
         
         # 마지막 청크 처리
-        if current_chunk.strip():
-            chunks.append(current_chunk.strip())
+        flush()
         
         return chunks
     
     
-    def parse_markdown_file(self, file_path: str) -> Tuple[Optional[Dict], str]:
+    async def parse_markdown_file(self, file_path: str) -> Tuple[Optional[Dict], str]:
         """
         마크다운 파일을 파싱하여 프론트매터와 내용을 분리합니다.
         
@@ -96,8 +263,8 @@ class MarkdownTagger:
             Tuple[Dict, str]: (프론트매터, 마크다운 내용)
         """
         try:
-            with open(file_path, 'r', encoding='utf-8') as file:
-                content = file.read()
+            async with aiofiles.open(file_path, 'r', encoding='utf-8') as file:
+                content = await file.read()
             
             # 프론트매터 분리
             if content.startswith('---'):
@@ -125,55 +292,138 @@ class MarkdownTagger:
             print(f"파일 읽기 오류: {e}")
             return None, ""
     
-    def generate_tags_for_chunk(self, chunk: str) -> List[str]:
+    @staticmethod
+    def _hashtag_section_end(response_text: str, marker: str) -> int:
         """
-        청크에 대해 Ollama API를 호출하여 태그를 생성합니다.
+        마지막 해시태그 섹션이 끝난 위치를 반환합니다. (태그 목록 뒤에 빈 줄이 나오면 완료)
+        
+        Returns:
+            int: 섹션이 끝난 위치, 아직 끝나지 않았으면 -1
         """
-        prompt = f"""다음 텍스트를 분석하여 먼저 요약본을 만들고, 그 요약본을 바탕으로 해시태그를 생성해주세요.
-
-1단계: 텍스트 요약
-이 텍스트의 핵심 내용을 3-5문장으로 요약해주세요.
-
-2단계: 해시태그 생성  
-요약본을 바탕으로 적절한 해시태그를 생성해주세요. 해시태그는 반드시 한글로 작성해주세요.
-각 해시태그는 한 줄에 하나씩 작성해주세요.
-태그에는 '#', '_' 기호나 띄어쓰기를 넣지 마세요. 모든 단어를 붙여서 작성해주세요.
-
-텍스트:
-{chunk}
-
-응답 형식:
-**요약:**
-[여기에 요약 내용 작성]
-
-**해시태그:**
-머신러닝
-데이터분석
-인공지능
-딥러닝
-파이썬프로그래밍"""
+        # 추론(<think>) 중에 나온 마커는 무시
+        think_end = response_text.rfind('</think>')
+        if think_end == -1 and '<think>' in response_text:
+            return -1
+        index = response_text.find(marker, max(think_end, 0))
+        if index == -1:
+            return -1
+        # 마커 뒤 첫 태그가 나온 이후의 빈 줄 찾기
+        section = response_text[index + len(marker):]
+        tags_start = index + len(marker) + len(section) - len(section.lstrip())
+        return response_text.find('\n\n', tags_start)
+    
+    async def _generate_response(self, prompt: str, client: ollama.AsyncClient,
+                                 sem: asyncio.Semaphore, stop_marker: str) -> str:
+        """
+        프롬프트로 Ollama API를 호출하여 응답 텍스트를 반환합니다. (캐시 우선)
+        
+        응답을 스트리밍으로 받으며, stop_marker로 시작하는 마지막 해시태그 섹션이
+        끝나면 나머지 생성을 기다리지 않고 연결을 닫습니다.
+        해시태그 섹션 전에 num_predict 한도에서 잘린 응답은 캐시하지 않고 예외를 발생시킵니다.
+        """
+        # 동일한 프롬프트의 응답이 캐시에 있으면 재사용
+        cache_key = self.cache.make_key(self.model_name, "", prompt) if self.cache else None
+        response_text = self.cache.get(cache_key) if cache_key else None
         
+        if response_text is None:
+            parts = []
+            done_reason = None
+            async with sem:
+                stream = await client.generate(
+                    model=self.model_name,
+                    prompt=prompt,
+                    stream=True,
+                    options=self._ollama_options()
+                )
+                try:
+                    async for part in stream:
+                        parts.append(part['response'])
+                        # 줄바꿈이 들어올 때만 섹션 완료 여부 확인
+                        if '\n' in part['response']:
+                            partial_text = ''.join(parts)
+                            section_end = self._hashtag_section_end(partial_text, stop_marker)
+                            if section_end != -1:
+                                parts = [partial_text[:section_end]]
+                                break
+                        if part.get('done'):
+                            done_reason = part.get('done_reason')
+                finally:
+                    # 조기 종료 시 스트림을 닫아 소켓을 반환
+                    await stream.aclose()
+            # <think> 도중에 잘린 응답은 추론 내용을 태그로 오인할 수 있으므로 실패로 처리
+            if done_reason == 'length':
+                raise RuntimeError(f"응답이 생성 토큰 한도(num_predict={self.num_predict})에서 잘렸습니다")
+            response_text = ''.join(parts)
+            if cache_key:
+                self.cache.set(cache_key, response_text)
+        
+        # XML 태그와 내용 모두 제거 (예: <think>내용</think>, <answer>내용</answer> 등)
+        response_text = _RE_THINK.sub('', response_text)
+        response_text = _RE_ANSWER.sub('', response_text)
+        response_text = _RE_REASONING.sub('', response_text)
+        # 남은 단순 태그도 제거
+        response_text = _RE_TAG.sub('', response_text)
+        
+        return response_text
+    
+    def _ollama_options(self, num_predict: Optional[int] = None) -> Dict:
+        """
+        Ollama 생성 옵션을 반환합니다. (Ollama는 max_tokens 대신 num_predict/num_ctx 사용)
+        """
+        return {
+            "temperature": 0.0,
+            "num_predict": self.num_predict if num_predict is None else num_predict,
+            "num_ctx": self.num_ctx,
+            "top_p": 0.9
+        }
+    
+    async def warm_up(self):
+        """
+        첫 청크가 모델 로딩 시간을 기다리지 않도록 1토큰 생성으로 모델을 미리 로드합니다.
+        """
         try:
-            response = ollama.generate(
+            await self._get_client().generate(
                 model=self.model_name,
-                prompt=prompt,
-                options={
-                    "temperature": 0.0,
-                    "max_tokens": self.max_tokens,
-                    "top_p": 0.9
-                }
+                prompt="",
+                options=self._ollama_options(num_predict=1)
             )
-            
-            # 응답에서 태그 추출
-            tags = []
-            response_text = response['response']
-            
-            # XML 태그와 내용 모두 제거 (예: <think>내용</think>, <answer>내용</answer> 등)
-            response_text = re.sub(r'<think>.*?</think>', '', response_text, flags=re.DOTALL)
-            response_text = re.sub(r'<answer>.*?</answer>', '', response_text, flags=re.DOTALL)
-            response_text = re.sub(r'<reasoning>.*?</reasoning>', '', response_text, flags=re.DOTALL)
-            # 남은 단순 태그도 제거
-            response_text = re.sub(r'<[^>]+>', '', response_text)
+        except Exception as e:
+            print(f"모델 예열 실패: {e}")
+    
+    def _extract_tags(self, hashtag_section: str) -> List[str]:
+        """
+        해시태그 섹션에서 한 줄에 하나씩 작성된 태그를 추출합니다.
+        """
+        tags = []
+        
+        # 줄바꿈으로 분리하여 태그 추출
+        lines = hashtag_section.strip().split('\n')
+        for line in lines:
+            line = line.strip()
+            # # 기호가 있으면 제거
+            if line.startswith('#'):
+                line = line[1:].strip()
+            # _ 기호와 공백 제거
+            line = line.translate(_WHITESPACE_TRANS)
+            # 빈 줄이 아니고 한글이 포함된 경우만 태그로 인정
+            if len(line) > 1 and _HANGUL_RE.search(line):
+                tags.append(line)
+        
+        return tags
+    
+    async def _gen_tags_async(self, chunk: str, client: ollama.AsyncClient,
+                              sem: asyncio.Semaphore) -> List[str]:
+        """
+        청크에 대해 Ollama API를 비동기로 호출하여 태그를 생성합니다.
+        
+        세마포어로 동시 요청 수를 제한하며, 실패 시 빈 리스트를 반환하여
+        다른 청크의 처리를 중단시키지 않습니다.
+        """
+        single_template, _ = _build_prompt_templates(self.prompt_profile or "general")
+        prompt = single_template.format(chunk=chunk)
+        
+        try:
+            response_text = await self._generate_response(prompt, client, sem, "**해시태그:**")
             
             # **해시태그:** 섹션 찾기
             hashtag_section = ""
@@ -185,25 +435,112 @@ class MarkdownTagger:
                 # 해시태그 섹션을 찾지 못한 경우 전체 텍스트에서 추출
                 hashtag_section = response_text
             
-            # 줄바꿈으로 분리하여 태그 추출
-            lines = hashtag_section.strip().split('\n')
-            for line in lines:
-                line = line.strip()
-                # # 기호가 있으면 제거
-                if line.startswith('#'):
-                    line = line[1:].strip()
-                # _ 기호와 공백 제거
-                line = line.replace('_', '').replace(' ', '')
-                # 빈 줄이 아니고 한글이 포함된 경우만 태그로 인정
-                if line and len(line) > 1 and any('\uac00' <= char <= '\ud7a3' for char in line):
-                    tags.append(line)
-            
-            return tags
+            return self._extract_tags(hashtag_section)
             
         except Exception as e:
             print(f"태그 생성 오류: {e}")
             return []
     
+    async def generate_tags_for_chunks_batch(self, chunks: List[str], client: ollama.AsyncClient,
+                                             sem: asyncio.Semaphore) -> List[List[str]]:
+        """
+        여러 청크를 하나의 요청으로 묶어 청크별 태그를 생성합니다.
+        
+        공통 프롬프트를 한 번만 보내므로 요청 수와 입력 토큰이 줄어듭니다.
+        응답에서 청크 수만큼 해시태그 섹션을 찾지 못하면 청크별 단일 요청으로 대체합니다.
+        """
+        if len(chunks) == 1:
+            return [await self._gen_tags_async(chunks[0], client, sem)]
+        
+        sections = "\n\n".join(f"### CHUNK {i} ###\n{chunk}" for i, chunk in enumerate(chunks, 1))
+        _, batch_template = _build_prompt_templates(self.prompt_profile or "general")
+        prompt = batch_template.format(count=len(chunks), sections=sections)
+        
+        try:
+            response_text = await self._generate_response(prompt, client, sem, f"**해시태그 {len(chunks)}:**")
+            
+            # **해시태그 N:** 섹션을 청크 번호별로 추출
+            tags_by_index = {}
+            for match in _RE_BATCH_HASHTAGS.finditer(response_text):
+                tags_by_index[int(match.group(1))] = self._extract_tags(match.group(2))
+            
+            if all(i in tags_by_index for i in range(1, len(chunks) + 1)):
+                return [tags_by_index[i] for i in range(1, len(chunks) + 1)]
+            
+            print(f"배치 응답 파싱 실패 ({len(tags_by_index)}/{len(chunks)}개 섹션), 청크별 요청으로 대체")
+        except Exception as e:
+            print(f"배치 태그 생성 오류: {e}, 청크별 요청으로 대체")
+        
+        return list(await asyncio.gather(*(self._gen_tags_async(chunk, client, sem) for chunk in chunks)))
+    
+    async def detect_prompt_profile(self, file_paths: List[str]) -> str:
+        """
+        파일들의 프론트매터 키 합집합으로 문서 유형을 판별하고 프롬프트 유형을 설정합니다.
+        """
+        parse_results = await asyncio.gather(*(self.parse_markdown_file(path) for path in file_paths))
+        schema_keys = set()
+        for frontmatter, _ in parse_results:
+            # 리스트나 스칼라로 된 프론트매터는 키가 없으므로 제외
+            if isinstance(frontmatter, dict):
+                schema_keys.update(frontmatter)
+        
+        self.prompt_profile = _select_prompt_profile(frozenset(schema_keys))
+        print(f"프롬프트 유형: {self.prompt_profile} (프론트매터 키 {len(schema_keys)}개, 파일 {len(file_paths)}개 기준)")
+        return self.prompt_profile
+    
+    def _split_size(self) -> int:
+        """
+        청크 분할 크기를 반환합니다.
+        
+        청크는 chunk_size // batch_size 토큰 이하로 나누어 batch_size개를 묶어도
+        합계가 chunk_size(= num_ctx 기준 입력 크기)를 넘지 않게 합니다.
+        """
+        return max(1, self.chunk_size // self.batch_size)
+    
+    def _group_chunks(self, counted_chunks: List[Tuple[str, int]]) -> List[List[str]]:
+        """
+        청크를 batch_size개씩, 합계 토큰이 chunk_size를 넘지 않도록 묶습니다.
+        
+        묶인 프롬프트도 단일 청크와 같은 num_ctx 안에 들어가야 하므로
+        청크는 _split_size() 크기로 분할되어 있어야 합니다.
+        """
+        groups = []
+        current_group = []
+        current_tokens = 0
+        
+        for chunk, chunk_tokens in counted_chunks:
+            if current_group and (len(current_group) >= self.batch_size
+                                  or current_tokens + chunk_tokens > self.chunk_size):
+                groups.append(current_group)
+                current_group = []
+                current_tokens = 0
+            current_group.append(chunk)
+            current_tokens += chunk_tokens
+        
+        if current_group:
+            groups.append(current_group)
+        
+        return groups
+    
+    def _get_client(self) -> ollama.AsyncClient:
+        """
+        실행 중 재사용할 AsyncClient를 반환합니다. (HTTP keep-alive 유지)
+        """
+        if self._client is None:
+            self._client = ollama.AsyncClient()
+        return self._client
+    
+    async def _generate_all_tags(self, counted_chunks: List[Tuple[str, int]]) -> List[List[str]]:
+        """
+        모든 청크의 태그를 동시에 생성합니다. (청크 순서 유지)
+        """
+        client = self._get_client()
+        sem = asyncio.Semaphore(self.concurrency)
+        groups = self._group_chunks(counted_chunks)
+        tasks = [self.generate_tags_for_chunks_batch(group, client, sem) for group in groups]
+        group_results = await asyncio.gather(*tasks)
+        return [tags for group_tags in group_results for tags in group_tags]
+    
     def merge_and_deduplicate_tags(self, all_tags: List[List[str]]) -> List[str]:
         """
         모든 청크에서 생성된 태그를 병합하고 중복을 제거하여 태그를 선택합니다.
@@ -211,36 +548,23 @@ class MarkdownTagger:
         if not all_tags:
             return []
         
-        # 모든 태그를 평면화하고 빈도수 계산
-        tag_counts = {}
+        # 모든 태그를 평면화하고 빈도수 계산 (원본 형태는 첫 번째 등장한 형태 사용)
+        tag_counts = Counter()
+        first_seen = {}
         for chunk_tags in all_tags:
-            if chunk_tags:  # None 체크 추가
-                for tag in chunk_tags:
-                    if tag:  # 빈 문자열 체크 추가
-                        tag_lower = tag.lower()
-                        if tag_lower in tag_counts:
-                            tag_counts[tag_lower] += 1
-                        else:
-                            tag_counts[tag_lower] = 1
-        
-        # 빈도수 기준으로 정렬하고 상위 10개 선택
-        sorted_tags = sorted(tag_counts.items(), key=lambda x: x[1], reverse=True)
+            for tag in chunk_tags or ():  # None 체크
+                if not tag:  # 빈 문자열 체크
+                    continue
+                tag_lower = tag.lower()
+                tag_counts[tag_lower] += 1
+                first_seen.setdefault(tag_lower, tag)
+        
+        # 빈도수 기준으로 정렬
+        sorted_tags = tag_counts.most_common()
         print(f"{sorted_tags}")
         
-        # 원본 형태로 복원 (첫 번째 등장한 형태 사용)
-        final_tags = []
-        for tag_lower, count in sorted_tags:
-            # 원본 태그 찾기
-            for chunk_tags in all_tags:
-                if chunk_tags:  # None 체크 추가
-                    for original_tag in chunk_tags:
-                        if original_tag and original_tag.lower() == tag_lower:
-                            final_tags.append(original_tag)
-                            break
-                    if len(final_tags) > len(sorted_tags[:len(final_tags)]) - 1:
-                        break
-           
-        return final_tags
+        # 원본 형태로 복원
+        return [first_seen[tag_lower] for tag_lower, _ in sorted_tags]
     
     def update_frontmatter_with_tags(self, frontmatter: Dict, tags: List[str]) -> Dict:
         """
@@ -255,18 +579,11 @@ class MarkdownTagger:
             existing_tags = [existing_tags]
         
         # 중복 제거하며 병합
-        all_tags = list(existing_tags) + tags
-        unique_tags = []
-        seen = set()
-        
-        for tag in all_tags:
-            print(f"태그 처리 중: {tag}")
-            tag_lower = tag.lower()
-            if tag_lower not in seen:
-                unique_tags.append(tag)
-                seen.add(tag_lower)
+        unique_tags = {}
+        for tag in list(existing_tags) + tags:
+            unique_tags.setdefault(tag.lower(), tag)
         
-        frontmatter['tags'] = unique_tags
+        frontmatter['tags'] = list(unique_tags.values())
         
         return frontmatter
     
@@ -282,13 +599,14 @@ class MarkdownTagger:
         """
         markdown_files = []
         try:
-            path = Path(directory_path)
-            if path.is_dir():
-                # .md 및 .markdown 파일을 재귀적으로 찾기
-                for pattern in ['**/*.md', '**/*.markdown']:
-                    markdown_files.extend(path.glob(pattern))
-                # Path 객체를 문자열로 변환
-                markdown_files = [str(f) for f in markdown_files]
+            if os.path.isdir(directory_path):
+                # .md 및 .markdown 파일을 한 번의 탐색으로 재귀적으로 찾기 (숨김 디렉토리 제외)
+                extensions = ('.md', '.markdown')
+                for root, dirs, names in os.walk(directory_path):
+                    dirs[:] = [d for d in dirs if not d.startswith('.')]
+                    for name in names:
+                        if name.endswith(extensions):
+                            markdown_files.append(os.path.join(root, name))
             else:
                 print(f"경고: {directory_path}는 디렉토리가 아닙니다.")
         except Exception as e:
@@ -296,7 +614,7 @@ class MarkdownTagger:
         
         return sorted(markdown_files)
     
-    def save_markdown_file(self, file_path: str, frontmatter: Dict, content: str):
+    async def save_markdown_file(self, file_path: str, frontmatter: Dict, content: str):
         """
         프론트매터와 내용을 마크다운 파일로 저장합니다.
         """
@@ -308,16 +626,29 @@ class MarkdownTagger:
             # 파일 내용 구성
             full_content = f"---\n{frontmatter_str}---\n\n{content}"
             
-            # 파일 저장
-            with open(file_path, 'w', encoding='utf-8') as file:
-                file.write(full_content)
+            # 임시 파일에 쓴 뒤 교체하여 쓰기 도중 실패해도 원본이 손상되지 않게 함
+            # 심볼릭 링크는 링크 대상 파일을 교체하고, 원본 파일의 권한을 유지
+            target_path = os.path.realpath(file_path)
+            tmp_path = f"{target_path}.tmp"
+            try:
+                async with aiofiles.open(tmp_path, 'w', encoding='utf-8') as file:
+                    await file.write(full_content)
+                    await file.flush()
+                    await asyncio.to_thread(os.fsync, file.fileno())
+                if os.path.exists(target_path):
+                    shutil.copymode(target_path, tmp_path)
+                os.replace(tmp_path, target_path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.unlink(tmp_path)
+                raise
             
             print(f"파일 저장 완료: {file_path}")
             
         except Exception as e:
             print(f"파일 저장 오류: {e}")
     
-    def process_markdown_file(self, file_path: str) -> bool:
+    async def process_markdown_file(self, file_path: str) -> bool:
         """
         마크다운 파일을 처리하여 태그를 추가합니다.
         """
@@ -325,7 +656,7 @@ class MarkdownTagger:
         
         try:
             # 파일 파싱
-            parse_result = self.parse_markdown_file(file_path)
+            parse_result = await self.parse_markdown_file(file_path)
             if parse_result is None or len(parse_result) != 2:
                 print("파일 파싱 실패")
                 return False
@@ -335,22 +666,40 @@ class MarkdownTagger:
                 print("프론트매터 파싱 실패")
                 return False
             
+            if not isinstance(frontmatter, dict):
+                print(f"건너뜀 (프론트매터가 키-값 형식이 아님): {file_path}")
+                return False
+            
             if content is None:
                 print("콘텐츠가 비어있습니다")
                 content = ""
             
-            # 텍스트 청킹
-            chunks = self.split_into_chunks(content, self.chunk_size)
-            if chunks is None:
+            # 마지막 태그 생성 이후 내용이 바뀌지 않았으면 건너뛰기
+            content_hash = hashlib.md5(content.encode('utf-8')).hexdigest()
+            if not self.force and frontmatter.get('md_tag_hash') == content_hash and frontmatter.get('tags'):
+                print(f"건너뜀 (내용 변경 없음): {file_path}")
+                return True
+            
+            # 디렉토리 모드에서 판별하지 않았으면 이 파일의 프론트매터로 프롬프트 유형 판별
+            if self.prompt_profile is None:
+                self.prompt_profile = _select_prompt_profile(frozenset(frontmatter))
+                print(f"프롬프트 유형: {self.prompt_profile}")
+            
+            # 텍스트 청킹 (여러 청크를 한 요청에 묶을 수 있도록 묶음 크기로 나눈 크기로 분할)
+            split_size = self._split_size()
+            counted_chunks = self._split_into_counted_chunks(content, split_size)
+            if counted_chunks is None:
                 print("청킹 실패")
                 return False
-            print(f"텍스트를 {len(chunks)}개 청크로 분할(청크 크기: {self.chunk_size} 토큰)")
+            print(f"텍스트를 {len(counted_chunks)}개 청크로 분할(청크 크기: {split_size} 토큰)")
+            
+            # 모든 청크에 대해 태그를 동시에 생성
+            print(f"청크 {len(counted_chunks)}개 태그 생성 중... (동시 요청: {self.concurrency})")
+            chunk_results = await self._generate_all_tags(counted_chunks)
             
-            # 각 청크에 대해 태그 생성
             all_tags = []
-            for i, chunk in enumerate(chunks):
-                print(f"청크 {i+1}/{len(chunks)} 처리 중...({self.count_tokens(chunk)} 토큰)")
-                chunk_tags = self.generate_tags_for_chunk(chunk)
+            for i, ((_, chunk_tokens), chunk_tags) in enumerate(zip(counted_chunks, chunk_results)):
+                print(f"청크 {i+1}/{len(counted_chunks)} ({chunk_tokens} 토큰)")
                 if chunk_tags:  # None 체크 추가
                     all_tags.append(chunk_tags)
                     print(f"생성된 태그: {chunk_tags}")
@@ -367,9 +716,15 @@ class MarkdownTagger:
             
             # 프론트매터 업데이트
             updated_frontmatter = self.update_frontmatter_with_tags(frontmatter, final_tags)
+            # 모든 청크에서 태그를 얻었을 때만 해시를 기록 (실패한 파일은 다음 실행에서 다시 처리)
+            if final_tags and all(chunk_results):
+                updated_frontmatter['md_tag_hash'] = content_hash
+            else:
+                updated_frontmatter.pop('md_tag_hash', None)
+                print("일부 청크의 태그 생성에 실패하여 다음 실행 때 다시 처리합니다")
             
             # 파일 저장
-            self.save_markdown_file(file_path, updated_frontmatter, content)
+            await self.save_markdown_file(file_path, updated_frontmatter, content)
             
             return True
             
@@ -377,9 +732,9 @@ class MarkdownTagger:
             print(f"파일 처리 오류: {e}")
             return False
     
-    def process_directory(self, directory_path: str) -> Dict[str, bool]:
+    async def process_directory(self, directory_path: str) -> Dict[str, bool]:
         """
-        디렉토리의 모든 마크다운 파일을 처리합니다.
+        디렉토리의 모든 마크다운 파일을 동시에 처리합니다.
         
         Args:
             directory_path: 처리할 디렉토리 경로
@@ -397,22 +752,32 @@ class MarkdownTagger:
         
         print(f"총 {len(markdown_files)}개의 마크다운 파일을 찾았습니다.")
         
-        results = {}
-        success_count = 0
+        if self.schema_detect:
+            await self.detect_prompt_profile(markdown_files[:self.schema_detect])
         
-        for i, file_path in enumerate(markdown_files, 1):
-            print(f"\n[{i}/{len(markdown_files)}] 처리 중...")
-            try:
-                success = self.process_markdown_file(file_path)
-                results[file_path] = success
-                if success:
-                    success_count += 1
-                    print(f"✅ 성공: {file_path}")
-                else:
-                    print(f"❌ 실패: {file_path}")
-            except Exception as e:
-                print(f"❌ 오류: {file_path} - {e}")
-                results[file_path] = False
+        print(f"동시 처리 파일 수: {self.file_concurrency}")
+        
+        file_sem = asyncio.Semaphore(self.file_concurrency)
+        
+        async def process_one(i: int, file_path: str) -> bool:
+            async with file_sem:
+                print(f"\n[{i}/{len(markdown_files)}] 처리 중...")
+                try:
+                    success = await self.process_markdown_file(file_path)
+                    if success:
+                        print(f"✅ 성공: {file_path}")
+                    else:
+                        print(f"❌ 실패: {file_path}")
+                    return success
+                except Exception as e:
+                    print(f"❌ 오류: {file_path} - {e}")
+                    return False
+        
+        successes = await asyncio.gather(
+            *(process_one(i, file_path) for i, file_path in enumerate(markdown_files, 1))
+        )
+        results = dict(zip(markdown_files, successes))
+        success_count = sum(1 for success in successes if success)
         
         print(f"\n=== 처리 완료 ===")
         print(f"총 파일: {len(markdown_files)}개")
@@ -422,6 +787,12 @@ class MarkdownTagger:
         return results
 
 
+async def _with_warm_up(tagger: MarkdownTagger, coro):
+    """모델을 예열한 뒤 처리 코루틴을 실행합니다."""
+    await tagger.warm_up()
+    return await coro
+
+
 def main():
     """메인 실행 함수"""
     parser = argparse.ArgumentParser(
@@ -451,7 +822,58 @@ def main():
         '--chunk-size',
         type=int,
         default=30000,
-        help='청크 크기 (기본값: 30000)'
+        help='청크 크기, Ollama 컨텍스트(num_ctx) 크기도 이 값으로 결정 (기본값: 30000)'
+    )
+    parser.add_argument(
+        '--num-predict',
+        type=int,
+        default=2048,
+        help='요청당 최대 생성 토큰 수 (기본값: 2048)'
+    )
+    parser.add_argument(
+        '--concurrency',
+        type=int,
+        default=4,
+        help='파일당 동시에 처리할 청크 요청 수 (기본값: 4)'
+    )
+    parser.add_argument(
+        '--file-concurrency',
+        type=int,
+        default=4,
+        help='디렉토리 모드에서 동시에 처리할 파일 수 (기본값: 4)'
+    )
+    parser.add_argument(
+        '--batch-size',
+        type=int,
+        default=5,
+        help='한 요청에 묶어 보낼 최대 청크 수, 청크는 청크 크기 / 이 값으로 분할 (기본값: 5, 1이면 청크별 요청)'
+    )
+    parser.add_argument(
+        '--fast-tokenize',
+        action='store_true',
+        help='청킹 시 tiktoken 대신 글자 수 기반 근사치로 토큰 수 계산'
+    )
+    parser.add_argument(
+        '--schema-detect',
+        type=int,
+        default=0,
+        metavar='K',
+        help='처음 K개 파일의 프론트매터 키로 문서 유형(blog/note/paper)을 판별해 프롬프트를 특화 (기본값: 0, 사용 안 함)'
+    )
+    parser.add_argument(
+        '--force',
+        action='store_true',
+        help='내용이 바뀌지 않은 파일도 다시 태그 생성'
+    )
+    parser.add_argument(
+        '--cache-path',
+        default=DEFAULT_CACHE_PATH,
+        help=f'LLM 응답 캐시 경로 (기본값: {DEFAULT_CACHE_PATH})'
+    )
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='LLM 응답 캐시를 사용하지 않음'
     )
     
     args = parser.parse_args()
@@ -465,7 +887,15 @@ def main():
     tagger = MarkdownTagger(
         model_name=args.model,
         max_tokens=args.max_tokens,
-        chunk_size=args.chunk_size
+        chunk_size=args.chunk_size,
+        concurrency=args.concurrency,
+        file_concurrency=args.file_concurrency,
+        cache=None if args.no_cache else LLMCache(args.cache_path),
+        batch_size=args.batch_size,
+        num_predict=args.num_predict,
+        force=args.force,
+        fast_tokenize=args.fast_tokenize,
+        schema_detect=args.schema_detect
     )
     
     try:
@@ -475,7 +905,7 @@ def main():
                 print(f"오류: -a 옵션을 사용하려면 디렉토리 경로를 지정해야 합니다: {args.path}")
                 return
             
-            results = tagger.process_directory(args.path)
+            results = asyncio.run(_with_warm_up(tagger, tagger.process_directory(args.path)))
             if results:
                 success_count = sum(1 for success in results.values() if success)
                 if success_count == len(results):
@@ -492,7 +922,7 @@ def main():
                 print(f"오류: 파일이 아닙니다: {args.path}")
                 return
             
-            success = tagger.process_markdown_file(args.path)
+            success = asyncio.run(_with_warm_up(tagger, tagger.process_markdown_file(args.path)))
             if success:
                 print("\n✅ 태그 추가 완료!")
             else:
@@ -1,84 +1,261 @@
 import subprocess
 import os
-from pathlib import Path
-from typing import Dict, List, Any
+import argparse
+import io
+import json
+import hashlib
+import mmap
+import shutil
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Any, Optional, Tuple
 import requests
+from requests.adapters import HTTPAdapter
 import re
+from llm_cache import LLMCache, DEFAULT_CACHE_PATH
 
 # Ollama는 환경변수나 .env 파일이 필요하지 않습니다
 
+# markdownlint-cli2 출력 한 줄: 파일경로:라인번호[:컬럼] MD규칙/설명 나머지설명
+_LINT_LINE_RE = re.compile(r'^(.+?):(\d+)(?::(\d+))? (MD\d+(?:/[\w-]+)?) (.+)$')
+_THINK_RE = re.compile(r'<think>.*?</think>', re.DOTALL)
+# 텍스트 앞뒤의 공백뿐인 줄 (첫 줄 들여쓰기는 포함하지 않음)
+_LEADING_BLANK_RE = re.compile(r'^(?:[ \t]*\n)*')
+_TRAILING_BLANK_RE = re.compile(r'(?:\n[ \t]*)*\Z')
+# 코드 블록 펜스 줄 (여는 펜스는 정보 문자열을 가질 수 있음)
+_FENCE_RE = re.compile(r'^[ \t]*(`{3,}|~{3,})')
+
+# 이 크기를 넘는 파일은 mmap으로 읽음 (작은 파일은 mmap 설정 비용이 더 큼)
+_MMAP_THRESHOLD = 256 * 1024
+
+
+def _read_text(file_path: str) -> str:
+    """파일을 UTF-8 문자열로 읽음 (큰 파일은 mmap 버퍼에서 바로 디코딩)"""
+    with open(file_path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size > _MMAP_THRESHOLD:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                text = str(mm, 'utf-8')
+        else:
+            text = f.read().decode('utf-8')
+    
+    # 텍스트 모드로 읽을 때처럼 줄바꿈을 \n으로 통일
+    if '\r' in text:
+        text = text.replace('\r\n', '\n').replace('\r', '\n')
+    return text
+
+
+def _write_text(file_path: str, text: str):
+    """문자열을 UTF-8로 인코딩해 버퍼링 없이 한 번에 씀"""
+    data = memoryview(text.encode('utf-8'))
+    with open(file_path, 'wb', buffering=0) as f:
+        while data:
+            data = data[f.write(data):]
+
+
+def _block_spans(lines: List[str]) -> List[Tuple[int, int]]:
+    """프론트매터와 펜스 코드 블록의 (시작, 끝) 줄 인덱스 목록을 반환 (끝은 포함하지 않음)
+    
+    닫히지 않은 코드 블록은 문서 끝까지로 보고, 닫히지 않은 프론트매터는 무시합니다.
+    """
+    spans = []
+    i = 0
+    if lines and lines[0].rstrip() == '---':
+        for j in range(1, len(lines)):
+            if lines[j].rstrip() in ('---', '...'):
+                spans.append((0, j + 1))
+                i = j + 1
+                break
+    
+    while i < len(lines):
+        match = _FENCE_RE.match(lines[i])
+        if not match:
+            i += 1
+            continue
+        fence = match.group(1)
+        end = len(lines)
+        for j in range(i + 1, len(lines)):
+            closing = lines[j].strip()
+            if closing.startswith(fence) and closing == fence[0] * len(closing):
+                end = j + 1
+                break
+        spans.append((i, end))
+        i = end
+    
+    return spans
+
+
+def _collapse_blank_lines(text: str) -> str:
+    """공백뿐인 줄이 이어져 줄바꿈이 3개 이상 연속되면 빈 줄 하나로 합침
+    
+    합칠 곳이 없으면 새 문자열을 만들지 않고 원본을 그대로 반환합니다.
+    """
+    pieces = []
+    pos = 0
+    length = len(text)
+    i = text.find('\n')
+    while i != -1:
+        # 줄바꿈에서 시작하는 공백 구간을 훑으며 마지막 줄바꿈 위치를 기록
+        newline_count = 0
+        last_newline = i
+        j = i
+        while j < length and text[j].isspace():
+            if text[j] == '\n':
+                newline_count += 1
+                last_newline = j
+            j += 1
+        if newline_count >= 3:
+            pieces.append(text[pos:i])
+            pieces.append('\n\n')
+            pos = last_newline + 1
+        i = text.find('\n', j)
+    
+    if not pieces:
+        return text
+    pieces.append(text[pos:])
+    return ''.join(pieces)
+
 
 class MarkdownLinter:
     """markdownlint-cli2를 사용한 마크다운 린터"""
     
+    # 한 번 실행에 넘길 파일 경로 길이 합계 (E2BIG을 피하도록 OS 명령줄 한도보다 작게, Windows 32K 포함)
+    MAX_ARGV_CHARS = 30000
+    
     def __init__(self):
         self.lint_results = []
+        
+        # 실행 파일 경로를 한 번만 찾아 두고, 없으면 처음 lint할 때가 아니라 시작할 때 알림
+        self._bin = shutil.which('markdownlint-cli2')
+        if self._bin is None:
+            raise RuntimeError("markdownlint-cli2를 찾을 수 없습니다. 설치: npm install -g markdownlint-cli2")
+        # Node.js 경고 배너가 stderr에 섞이지 않도록 끔
+        self._env = {**os.environ, 'NODE_NO_WARNINGS': '1'}
     
     def lint_file(self, file_path: str) -> List[Dict[str, Any]]:
         """마크다운 파일을 lint하고 결과를 파싱하여 반환"""
+        return self.lint_files([file_path]).get(file_path, [])
+    
+    def lint_files(self, file_paths: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+        """여러 마크다운 파일을 markdownlint-cli2로 lint하고 파일별 결과를 반환
+        
+        파일마다 Node.js를 새로 띄우지 않도록 명령줄 길이 한도 안에서 여러 파일을 한 번에 넘깁니다.
+        lint를 실행하지 못하면 문제가 없는 것으로 보지 않고 RuntimeError를 발생시킵니다.
+        """
+        lint_results = {file_path: [] for file_path in file_paths}
+        
+        batch = []
+        batch_chars = 0
+        for file_path in file_paths:
+            if batch and batch_chars + len(file_path) + 1 > self.MAX_ARGV_CHARS:
+                self._lint_batch(batch, lint_results)
+                batch = []
+                batch_chars = 0
+            batch.append(file_path)
+            batch_chars += len(file_path) + 1
+        if batch:
+            self._lint_batch(batch, lint_results)
+        
+        return lint_results
+    
+    def _lint_batch(self, file_paths: List[str], lint_results: Dict[str, List[Dict[str, Any]]]):
+        """markdownlint-cli2를 한 번 실행해 결과를 lint_results에 추가"""
+        # 출력된 경로를 절대 경로로 정규화하여 요청한 경로와 매칭
+        path_by_abspath = {os.path.abspath(file_path): file_path for file_path in file_paths}
+        # 절대 경로로 찾지 못했을 때 파일 이름으로 찾되, 이름이 겹치는 파일(README.md 등)은 제외
+        basename_counts = Counter(os.path.basename(file_path) for file_path in file_paths)
+        path_by_basename = {os.path.basename(file_path): file_path for file_path in file_paths
+                            if basename_counts[os.path.basename(file_path)] == 1}
+        
         try:
-            # markdownlint-cli2 실행
-            result = subprocess.run(
-                ['markdownlint-cli2', file_path],
-                capture_output=True,
+            # markdownlint-cli2 실행 (에러를 stderr로 출력하므로 stderr를 줄 단위로 읽으며 바로 파싱)
+            with subprocess.Popen(
+                [self._bin, *file_paths],
+                env=self._env,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.PIPE,
                 text=True,
-                check=False
-            )
-            
-            # print(f"Lint 결과: {result.stderr}")
-            
-            lint_issues = []
-            if result.stderr:  # markdownlint-cli2는 에러를 stderr로 출력
-                lines = result.stderr.strip().split('\n')
-                for line in lines:
-                    if line.strip() and ':' in line:
-                        # markdownlint-cli2 출력 파싱
-                        # 형식: tests/07월 11일 월가소식.md:8 MD022/blanks-around-headings Headings should be...
-                        # 또는: tests/07월 11일 월가소식.md:8:1 MD007/ul-indent Unordered list indentation...
+                bufsize=1
+            ) as proc:
+                for line in proc.stderr:
+                    # 규칙 코드(" MD")가 없는 줄(배너, 요약 등)은 정규식 없이 건너뛰기
+                    if ' MD' not in line:
+                        continue
+                    
+                    # markdownlint-cli2 출력 파싱
+                    # 형식: tests/07월 11일 월가소식.md:8 MD022/blanks-around-headings Headings should be...
+                    # 또는: tests/07월 11일 월가소식.md:8:1 MD007/ul-indent Unordered list indentation...
+                    try:
+                        # 정규식을 사용하여 파싱 (파일명에 공백이 있어도 처리)
+                        match = _LINT_LINE_RE.match(line.rstrip('\n'))
                         
-                        try:
-                            # 정규식을 사용하여 파싱 (파일명에 공백이 있어도 처리)
-                            # 패턴: 파일경로:라인번호[:컬럼] MD규칙/설명 나머지설명
-                            pattern = r'^(.+?):(\d+)(?::(\d+))? (MD\d+(?:/[\w-]+)?) (.+)$'
-                            match = re.match(pattern, line)
+                        if match:
+                            file_name = match.group(1)
                             
-                            if match:
-                                file_name = match.group(1)
-                                line_num = int(match.group(2))
-                                column = int(match.group(3)) if match.group(3) else 0
-                                rule = match.group(4)
-                                description = match.group(5)
-                                
-                                # 파일 경로가 실제 파일과 일치하는지 확인
-                                if file_name == file_path or file_name.endswith(os.path.basename(file_path)):
-                                    lint_issues.append({
-                                        'file': file_name,
-                                        'line': line_num,
-                                        'column': column,
-                                        'rule': rule,
-                                        'description': description
-                                    })
+                            # 파일 경로가 실제 파일과 일치하는지 확인
+                            file_path = path_by_abspath.get(os.path.abspath(file_name))
+                            if file_path is None:
+                                file_path = path_by_basename.get(os.path.basename(file_name))
+                            if file_path is None:
+                                continue
                             
-                        except (ValueError, IndexError) as e:
-                            # 파싱 실패한 라인은 건너뛰기
-                            continue
-            
-            return lint_issues
-            
-        except subprocess.CalledProcessError as e:
-            print(f"Lint 실행 중 오류 발생: {e}")
-            return []
-        except Exception as e:
-            print(f"예상치 못한 오류: {e}")
-            return []
+                            lint_results[file_path].append({
+                                'file': file_name,
+                                'line': int(match.group(2)),
+                                'column': int(match.group(3)) if match.group(3) else 0,
+                                'rule': match.group(4),
+                                'description': match.group(5)
+                            })
+                        
+                    except (ValueError, IndexError) as e:
+                        # 파싱 실패한 라인은 건너뛰기
+                        continue
+        except OSError as e:
+            raise RuntimeError(f"markdownlint-cli2 실행 실패: {e}") from e
+        
+        # 종료 코드 0은 문제 없음, 1은 문제 발견, 그 외(2 등)는 설정 오류 등으로 lint 실패
+        if proc.returncode not in (0, 1):
+            raise RuntimeError(f"markdownlint-cli2가 비정상 종료했습니다 (종료 코드 {proc.returncode})")
 
 
 class MarkdownFixer:
     """Ollama를 사용한 마크다운 수정기"""
     
-    def __init__(self, model_name: str = "qwen3:30b-32k-0.0", ollama_url: str = "http://localhost:11434"):
+    # 스트리밍 진행 표시 간격 (응답 조각 수)
+    PROGRESS_INTERVAL = 200
+    # 구간 수정 대신 전체 문서를 보내야 하는 규칙 (제목 구조처럼 문서 전체를 봐야 고칠 수 있음)
+    STRUCTURAL_RULES = {'MD001', 'MD025', 'MD041', 'MD043'}
+    # 문제 구간이 전체 줄 수의 이 비율을 넘으면 전체 문서 수정
+    WINDOW_MAX_RATIO = 0.6
+    # 기본 컨텍스트(num_ctx) 크기: 모델 최대 컨텍스트만큼 KV 캐시를 잡지 않도록 작게 두고
+    # num_ctx가 바뀌면 Ollama가 모델을 다시 로드하므로 요청마다 바꾸지 않고 실행 내내 같은 값을 사용
+    DEFAULT_CTX = 16384
+    # 요청당 최대 생성 토큰 수
+    MAX_PREDICT = 16384
+    # 수정 결과 외에 <think> 추론 출력을 위해 더하는 생성 토큰 여유
+    REASONING_TOKENS = 8192
+    # 모델이 프롬프트의 구간 표시를 따라 쓰기 시작하면 생성 중단
+    STOP_SEQUENCES = ["\n=== 마크다운", "\n=== Lint"]
+    
+    def __init__(self, model_name: str = "qwen3:30b-32k-0.0", ollama_url: str = "http://localhost:11434",
+                 stream: bool = True, cache: Optional[LLMCache] = None, num_ctx: int = DEFAULT_CTX):
         self.model_name = model_name
         self.ollama_url = ollama_url
+        self.stream = stream
+        # 모든 수정 요청에 같은 컨텍스트 크기를 사용해 모델 재로드를 피함
+        self.num_ctx = num_ctx
+        # 같은 내용과 lint 결과로 다시 요청하면 캐시된 응답 사용 (None이면 캐시 사용 안 함)
+        self.cache = cache
+        self.options = {
+            "temperature": 0.1,
+            "top_p": 0.9,
+            "top_k": 40
+        }
+        
+        # 요청마다 새 연결을 맺지 않도록 keep-alive 세션을 재사용 (스레드 풀 크기만큼 연결 유지)
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=8)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
         
         self.system_prompt = """당신은 마크다운 문서를 개선하는 전문가입니다.
 주어진 마크다운 내용과 markdownlint-cli2의 lint 결과를 바탕으로 다음 작업을 수행해주세요:
@@ -107,10 +284,82 @@ class MarkdownFixer:
 수정된 마크다운만 반환하고, 다른 설명은 추가하지 마세요.
 원본의 의미와 내용은 변경하지 말고, 형식과 문법만 개선해주세요.
 frontmatter는 그대로 유지하세요."""
+        
+        # 요청마다 같은 시스템 메시지는 JSON 바이트로 한 번만 인코딩해 두고 재사용
+        self._system_message_json = json.dumps(
+            {"role": "system", "content": self.system_prompt}, ensure_ascii=False
+        ).encode('utf-8')
 
     def fix_markdown(self, content: str, lint_results: List[Dict[str, Any]]) -> str:
-        """마크다운 내용과 lint 결과를 바탕으로 수정된 마크다운 반환"""
+        """마크다운 내용과 lint 결과를 바탕으로 수정된 마크다운 반환
+        
+        문제가 일부 구간에 몰려 있으면 해당 구간(앞뒤 문맥 포함)만 모델에 보내고
+        수정된 구간을 원래 위치에 다시 끼워 넣습니다.
+        """
+        if not lint_results:
+            return content
+        
+        lines = content.split('\n')
+        windows = self._extract_windows(content, lint_results)
+        affected = sum(end - start for start, end, _ in windows)
+        rules = {issue['rule'].partition('/')[0] for issue in lint_results}
+        
+        # 문서 구조 전체를 봐야 하는 규칙이 있거나 대부분의 줄이 영향을 받으면 전체 문서 수정
+        if rules & self.STRUCTURAL_RULES or affected > len(lines) * self.WINDOW_MAX_RATIO:
+            fixed_content = self._fix_document(content, lint_results)
+            if fixed_content is not None:
+                return fixed_content
+            # 문서 전체가 컨텍스트에 들어가지 않으면 구간 수정으로 대체
+            print(f"   ⚠️  문서가 컨텍스트(num_ctx={self.num_ctx})에 들어가지 않아 문제 구간만 수정합니다")
+        
+        print(f"   ✂️  {len(windows)}개 구간만 수정 ({affected}/{len(lines)}줄)")
+        # 뒤쪽 구간부터 교체하여 앞쪽 구간의 줄 번호가 바뀌지 않게 함
+        for start, end, slice_text in reversed(windows):
+            window_issues = [issue for issue in lint_results if start < issue['line'] <= end]
+            fixed_slice = self._fix_window(slice_text, window_issues, start, end, len(lines))
+            if fixed_slice is not None:
+                lines[start:end] = fixed_slice.split('\n')
+        
+        return '\n'.join(lines)
+    
+    def _extract_windows(self, content: str, lint_results: List[Dict[str, Any]],
+                         ctx: int = 5) -> List[Tuple[int, int, str]]:
+        """문제 줄 주변 ±ctx줄을 구간으로 묶어 (시작, 끝, 구간 텍스트) 목록을 반환
+        
+        시작/끝은 0부터 시작하는 줄 인덱스이며 끝은 포함하지 않습니다. 겹치거나 맞닿는 구간은 합칩니다.
+        구간 경계가 코드 블록이나 프론트매터 안에 걸리면 모델이 열린 블록을 닫아 버리므로
+        경계를 블록 바깥으로 넓힙니다.
+        """
+        lines = content.split('\n')
+        # 줄마다 자신을 감싸는 블록 (시작, 끝)
+        enclosing = [None] * len(lines)
+        for block_start, block_end in _block_spans(lines):
+            for i in range(block_start, block_end):
+                enclosing[i] = (block_start, block_end)
+        
+        ranges = []
+        for line_num in sorted({issue['line'] for issue in lint_results}):
+            start = max(0, line_num - 1 - ctx)
+            while True:
+                # 들여쓴 줄(중첩 목록 등) 중간에서 시작하지 않도록 블록 시작까지 확장
+                while start > 0 and lines[start][:1] in (' ', '\t'):
+                    start -= 1
+                if enclosing[start] is None or enclosing[start][0] == start:
+                    break
+                start = enclosing[start][0]
+            end = min(len(lines), line_num + ctx)
+            if enclosing[end - 1] is not None:
+                end = enclosing[end - 1][1]
+            if ranges and start <= ranges[-1][1]:
+                ranges[-1][0] = min(ranges[-1][0], start)
+                ranges[-1][1] = max(ranges[-1][1], end)
+            else:
+                ranges.append([start, end])
         
+        return [(start, end, '\n'.join(lines[start:end])) for start, end in ranges]
+    
+    def _fix_document(self, content: str, lint_results: List[Dict[str, Any]]) -> Optional[str]:
+        """문서 전체를 모델에 보내 수정 (컨텍스트에 들어가지 않으면 요청하지 않고 None)"""
         # lint 결과를 사용자 친화적인 형태로 변환
         lint_summary = self._format_lint_results(lint_results)
         
@@ -124,56 +373,218 @@ frontmatter는 그대로 유지하세요."""
 
 위의 lint 결과를 참고하여 마크다운을 수정해주세요."""
 
+        if not self._fits_context(user_message, content):
+            return None
+        fixed_content = self._request_fix(user_message, content)
+        return fixed_content if fixed_content else content
+    
+    def _fix_window(self, slice_text: str, lint_results: List[Dict[str, Any]],
+                    start: int, end: int, total_lines: int) -> Optional[str]:
+        """문서의 한 구간만 모델에 보내 수정된 구간을 반환 (실패 시 None)
+        
+        total_lines는 문서 전체 줄 수로, 구간이 문서 처음이나 끝에 닿는지 판단하는 데 사용합니다.
+        """
+        lint_summary = self._format_lint_results(lint_results)
+        
+        user_message = f"""다음은 마크다운 문서의 {start + 1}~{end}번째 줄입니다. 이 구간만 수정해주세요:
+
+=== 마크다운 구간 ===
+{slice_text}
+
+=== Lint 결과 (원본 문서 기준 줄 번호) ===
+{lint_summary}
+
+위의 lint 결과를 참고하여 이 구간만 수정하고, 수정된 구간만 반환해주세요. 구간 밖의 내용은 추가하지 마세요."""
+
+        fixed_slice = self._request_fix(user_message, slice_text, keep_indent=True)
+        if not fixed_slice:
+            return None
+        
+        # 응답 정리 과정에서 사라진 구간 앞뒤의 공백뿐인 줄을 원본 그대로 복원
+        # 문서 처음/끝에 닿는 구간은 그 줄들이 lint 대상(MD012 등)일 수 있으므로 복원하지 않고,
+        # 문서 끝에는 원본처럼 마지막 줄바꿈 하나만 남김
+        leading = _LEADING_BLANK_RE.match(slice_text).group() if start > 0 else ''
+        if end < total_lines:
+            trailing = _TRAILING_BLANK_RE.search(slice_text).group()
+        else:
+            trailing = '\n' if slice_text.endswith('\n') else ''
+        return leading + fixed_slice + trailing
+    
+    def _generation_budget(self, user_message: str) -> int:
+        """프롬프트를 뺀 컨텍스트에 남는 생성 토큰 수 (글자 수를 토큰 수의 상한으로 사용)"""
+        return self.num_ctx - len(self.system_prompt) - len(user_message)
+    
+    def _fits_context(self, user_message: str, target_text: str) -> bool:
+        """수정 결과를 다 생성할 만큼 컨텍스트가 남는지 여부
+        
+        남는 생성 토큰 수가 수정 대상보다 적으면 응답이 반드시 잘리므로 요청할 필요가 없습니다.
+        """
+        return self._generation_budget(user_message) >= len(target_text)
+    
+    def _request_options(self, user_message: str, target_text: str) -> Dict[str, Any]:
+        """수정할 텍스트 길이에 맞춰 생성 토큰 수를 제한한 options 반환
+        
+        한국어는 대략 글자당 1토큰 이하이므로 글자 수를 토큰 수의 상한으로 사용합니다.
+        수정 결과는 원본의 2배를 넘는 일이 드물며, <think> 출력을 위한 여유를 더합니다.
+        생성 토큰 수는 프롬프트를 뺀 컨텍스트 크기를 넘지 않으며, 컨텍스트 크기는 고정입니다.
+        """
+        num_predict = min(2 * len(target_text) + self.REASONING_TOKENS, self.MAX_PREDICT)
+        num_predict = max(1, min(num_predict, self._generation_budget(user_message)))
+        return {
+            **self.options,
+            "num_predict": num_predict,
+            "num_ctx": self.num_ctx,
+            "stop": self.STOP_SEQUENCES
+        }
+    
+    def _encode_chat_body(self, user_message: str, **fields) -> bytes:
+        """/api/chat 요청 본문을 UTF-8 JSON 바이트로 만듦
+        
+        미리 인코딩한 시스템 메시지 조각에 사용자 메시지와 나머지 필드만 인코딩해 붙입니다.
+        한글을 \\uXXXX로 이스케이프하지 않으므로 본문 크기도 절반 가까이 줄어듭니다.
+        """
+        user_json = json.dumps({"role": "user", "content": user_message}, ensure_ascii=False).encode('utf-8')
+        fields_json = json.dumps({"model": self.model_name, **fields}, ensure_ascii=False).encode('utf-8')
+        return b'{"messages": [' + self._system_message_json + b', ' + user_json + b'], ' + fields_json[1:]
+    
+    def _request_fix(self, user_message: str, target_text: str,
+                     keep_indent: bool = False) -> Optional[str]:
+        """Ollama에 수정 요청을 보내고 정리된 응답을 반환 (실패하거나 빈 응답이면 None)
+        
+        target_text는 수정 대상 텍스트(문서 전체 또는 구간)로, 생성 길이 제한을 정하는 데 사용합니다.
+        target_text 자체가 코드 블록으로 시작하고 끝나면 응답의 코드 블록을 벗기지 않습니다.
+        keep_indent가 True면 앞뒤의 공백뿐인 줄만 제거해 첫 줄 들여쓰기를 유지합니다 (구간 수정용).
+        """
+        cache_key = self.cache.make_key(self.model_name, self.system_prompt, user_message) if self.cache else None
+        if cache_key:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                print("💾 캐시된 응답 사용")
+                return cached
+
+        # 응답이 잘릴 것이 확실하면 프롬프트 처리와 생성을 낭비하지 않도록 요청하지 않음
+        if not self._fits_context(user_message, target_text):
+            print(f"⚠️  컨텍스트(num_ctx={self.num_ctx})가 부족해 원본을 유지합니다 (--num-ctx로 늘릴 수 있음)")
+            return None
+
         try:
             # Ollama API 호출
-            response = requests.post(
-                f"{self.ollama_url}/api/generate",
-                json={
-                    "model": self.model_name,
-                    "prompt": f"System: {self.system_prompt}\n\nHuman: {user_message}\n\nAssistant: ",
-                    "stream": False,
-                    "options": {
-                        "temperature": 0.1,
-                        "top_p": 0.9,
-                        "top_k": 40
-                    }
-                },
-                timeout=300  # 5분 타임아웃
+            # 시스템 프롬프트를 별도 메시지로 보내 매번 같은 접두부를 유지 (Ollama가 접두부 KV 캐시를 재사용)
+            response = self._session.post(
+                f"{self.ollama_url}/api/chat",
+                data=self._encode_chat_body(
+                    user_message,
+                    stream=self.stream,
+                    # 파일 사이에 모델이 내려가지 않도록 유지
+                    keep_alive="30m",
+                    options=self._request_options(user_message, target_text)
+                ),
+                headers={"Content-Type": "application/json"},
+                stream=self.stream,
+                timeout=300  # 5분 타임아웃 (스트리밍 시에는 조각 사이 대기 시간)
             )
             
             if response.status_code == 200:
-                result = response.json()
-                fixed_content = result.get('response', '').strip()
+                if self.stream:
+                    fixed_content, done_reason = self._read_stream(response)
+                else:
+                    result = response.json()
+                    fixed_content = result.get('message', {}).get('content', '')
+                    done_reason = result.get('done_reason')
                 
+                # 생성 한도에 걸려 잘린 응답을 저장하면 내용이 사라지므로 버림
+                if done_reason == 'length':
+                    print("⚠️  응답이 생성 토큰 한도에서 잘려 원본을 유지합니다")
+                    return None
                 # <think>...</think> 패턴 제거
-                fixed_content = re.sub(r'<think>.*?</think>', '', fixed_content, flags=re.DOTALL)
+                fixed_content = self._trim(_THINK_RE.sub('', fixed_content), keep_indent)
                 
-                # 응답에서 마크다운 코드 블록 제거 (있는 경우)
-                if fixed_content.startswith('```') and fixed_content.endswith('```'):
-                    lines = fixed_content.split('\n')
-                    if len(lines) > 2:
-                        fixed_content = '\n'.join(lines[1:-1])
+                # 응답을 감싼 마크다운 코드 블록 제거 (있는 경우, 첫 줄과 마지막 줄만 잘라냄)
+                # 수정 대상이 원래 코드 블록으로 시작하고 끝나면 문서 내용이므로 그대로 둠
+                target = target_text.strip()
+                wrapped = target.startswith('```') and target.endswith('```')
+                if not wrapped and fixed_content.startswith('```') and fixed_content.endswith('```'):
+                    first_newline = fixed_content.find('\n')
+                    last_newline = fixed_content.rfind('\n')
+                    if first_newline != last_newline:
+                        fixed_content = fixed_content[first_newline + 1:last_newline]
                 
                 # 추가 정리: 연속된 빈 줄 제거
-                fixed_content = re.sub(r'\n\s*\n\s*\n', '\n\n', fixed_content)
-                fixed_content = fixed_content.strip()
+                fixed_content = self._trim(_collapse_blank_lines(fixed_content), keep_indent)
                 
-                return fixed_content if fixed_content else content
+                if not fixed_content:
+                    return None
+                if cache_key:
+                    self.cache.set(cache_key, fixed_content)
+                return fixed_content
             else:
                 print(f"Ollama API 오류: {response.status_code} - {response.text}")
-                return content
+                return None
                 
         except requests.exceptions.ConnectionError:
             print("❌ Ollama 서버에 연결할 수 없습니다. Ollama가 실행 중인지 확인하세요.")
             print("   Ollama 설치: https://ollama.ai")
             print(f"   모델 다운로드: ollama pull {self.model_name}")
-            return content
+            return None
         except requests.exceptions.Timeout:
             print("⏰ Ollama 응답 시간이 초과되었습니다. 다시 시도해주세요.")
-            return content
+            return None
         except Exception as e:
             print(f"Ollama 호출 중 오류 발생: {e}")
-            return content  # 오류 시 원본 반환
+            return None  # 오류 시 원본 유지
+    
+    @staticmethod
+    def _trim(text: str, keep_indent: bool) -> str:
+        """응답 앞뒤 공백 제거 (keep_indent면 공백뿐인 줄만 제거)"""
+        if not keep_indent:
+            return text.strip()
+        text = text[_LEADING_BLANK_RE.match(text).end():]
+        return text[:_TRAILING_BLANK_RE.search(text).start()]
+    
+    def warm_up(self) -> bool:
+        """시스템 프롬프트만으로 1토큰을 생성해 모델 로드와 시스템 프롬프트 처리를 미리 끝냄
+        
+        수정 요청과 같은 num_ctx로 로드해야 첫 요청에서 모델을 다시 로드하지 않습니다.
+        """
+        try:
+            response = self._session.post(
+                f"{self.ollama_url}/api/chat",
+                json={
+                    "model": self.model_name,
+                    "messages": [{"role": "system", "content": self.system_prompt}],
+                    "stream": False,
+                    "keep_alive": "30m",
+                    "options": {**self.options, "num_predict": 1, "num_ctx": self.num_ctx}
+                },
+                timeout=300
+            )
+            return response.status_code == 200
+        except requests.exceptions.RequestException as e:
+            print(f"⚠️  모델 예열 실패: {e}")
+            return False
+    
+    def _read_stream(self, response: requests.Response) -> Tuple[str, Optional[str]]:
+        """스트리밍 응답(JSON 줄 단위)을 받아 (전체 내용, 종료 이유)를 반환"""
+        buffer = io.StringIO()
+        part_count = 0
+        done_reason = None
+        for line in response.iter_lines():
+            if not line:
+                continue
+            part = json.loads(line)
+            if 'error' in part:
+                raise RuntimeError(part['error'])
+            
+            buffer.write(part.get('message', {}).get('content', ''))
+            part_count += 1
+            if part_count % self.PROGRESS_INTERVAL == 0:
+                print(f"   ... {part_count}개 토큰 수신")
+            
+            if part.get('done'):
+                done_reason = part.get('done_reason')
+                break
+        
+        return buffer.getvalue(), done_reason
     
     def _format_lint_results(self, lint_results: List[Dict[str, Any]]) -> str:
         """lint 결과를 Ollama가 이해하기 쉬운 형태로 포맷팅"""
@@ -181,12 +592,9 @@ frontmatter는 그대로 유지하세요."""
             return "발견된 lint 문제가 없습니다."
         
         # 규칙별로 그룹화하여 더 체계적으로 표시
-        rule_groups = {}
+        rule_groups = defaultdict(list)
         for issue in lint_results:
-            rule = issue['rule'].split('/')[0] if '/' in issue['rule'] else issue['rule']
-            if rule not in rule_groups:
-                rule_groups[rule] = []
-            rule_groups[rule].append(issue)
+            rule_groups[issue['rule'].partition('/')[0]].append(issue)
         
         formatted_results = []
         for rule, issues in rule_groups.items():
@@ -204,38 +612,52 @@ frontmatter는 그대로 유지하세요."""
 class MarkdownProcessor:
     """마크다운 처리 메인 클래스"""
     
-    def __init__(self, model_name: str = "qwen3:30b-32k-0.0"):
+    def __init__(self, model_name: str = "qwen3:30b-32k-0.0", cache: Optional[LLMCache] = None,
+                 verify: bool = False, num_ctx: int = MarkdownFixer.DEFAULT_CTX):
         self.linter = MarkdownLinter()
-        self.fixer = MarkdownFixer(model_name=model_name)
+        self.fixer = MarkdownFixer(model_name=model_name, cache=cache, num_ctx=num_ctx)
+        # 수정 후 lint를 다시 실행해 개선 결과를 확인할지 여부
+        self.verify = verify
     
-    def process_file(self, input_path: str, output_path: str = None) -> bool:
-        """마크다운 파일을 처리하여 수정된 버전 생성"""
+    def process_file(self, input_path: str, output_path: str = None,
+                     lint_results: List[Dict[str, Any]] = None, verify: bool = None) -> bool:
+        """마크다운 파일을 처리하여 수정된 버전 생성
+        
+        lint_results를 넘기면 (디렉토리 일괄 lint 결과) lint를 다시 실행하지 않습니다.
+        verify를 지정하지 않으면 프로세서의 verify 설정을 따릅니다.
+        """
+        if verify is None:
+            verify = self.verify
+        
         try:
-            # 입력 파일 읽기
-            with open(input_path, 'r', encoding='utf-8') as f:
-                original_content = f.read()
-            
             print(f"📝 파일 분석 중: {input_path}")
             
             # Lint 실행
-            lint_results = self.linter.lint_file(input_path)
+            if lint_results is None:
+                lint_results = self.linter.lint_file(input_path)
             print(f"🔍 {len(lint_results)}개의 lint 문제 발견")
             
-            if lint_results:
-                # 규칙별 문제 수 요약 출력
-                rule_counts = {}
-                for issue in lint_results:
-                    rule = issue['rule'].split('/')[0] if '/' in issue['rule'] else issue['rule']
-                    rule_counts[rule] = rule_counts.get(rule, 0) + 1
-                
-                print("   주요 문제들:")
-                for rule, count in sorted(rule_counts.items(), key=lambda x: x[1], reverse=True)[:5]:
-                    print(f"   - {rule}: {count}개")
-                
-                if len(rule_counts) > 5:
-                    top_5_rules = [r for r, _ in sorted(rule_counts.items(), key=lambda x: x[1], reverse=True)[:5]]
-                    remaining = sum(count for rule, count in rule_counts.items() if rule not in top_5_rules)
-                    print(f"   - 기타: {remaining}개")
+            # 고칠 문제가 없으면 Ollama 호출 없이 종료
+            if not lint_results:
+                print("✅ 문제가 없어 수정을 건너뜁니다")
+                if output_path and os.path.abspath(output_path) != os.path.abspath(input_path):
+                    shutil.copyfile(input_path, output_path)
+                return True
+            
+            # 입력 파일 읽기
+            original_content = _read_text(input_path)
+            
+            # 규칙별 문제 수 요약 출력
+            rule_counts = Counter(issue['rule'].partition('/')[0] for issue in lint_results)
+            top_5_rules = rule_counts.most_common(5)
+            
+            print("   주요 문제들:")
+            for rule, count in top_5_rules:
+                print(f"   - {rule}: {count}개")
+            
+            if len(rule_counts) > 5:
+                remaining = len(lint_results) - sum(count for _, count in top_5_rules)
+                print(f"   - 기타: {remaining}개")
             
             # Ollama로 마크다운 수정
             print(f"🦙 Ollama ({self.fixer.model_name})로 마크다운 수정 중...")
@@ -246,15 +668,17 @@ class MarkdownProcessor:
                 output_path = input_path
             
             # 수정된 내용 저장
-            with open(output_path, 'w', encoding='utf-8') as f:
-                f.write(fixed_content)
+            _write_text(output_path, fixed_content)
             
             print(f"✅ 수정 완료: {output_path}")
             
             # 수정 후 다시 lint 실행하여 개선 확인
-            post_lint_results = self.linter.lint_file(output_path)
-            improvement = len(lint_results) - len(post_lint_results)
-            print(f"📊 개선 결과: {improvement}개 문제 해결 ({len(post_lint_results)}개 남음)")
+            if verify:
+                try:
+                    post_lint_results = self.linter.lint_file(output_path)
+                    self._print_improvement(lint_results, post_lint_results)
+                except RuntimeError as e:
+                    print(f"⚠️  수정 후 lint 실패: {e}")
             
             return True
             
@@ -262,42 +686,143 @@ class MarkdownProcessor:
             print(f"❌ 처리 중 오류 발생: {e}")
             return False
     
-    def process_directory(self, directory_path: str, recursive: bool = True):
-        """디렉토리 내 모든 마크다운 파일 처리"""
-        directory = Path(directory_path)
+    def _print_improvement(self, lint_results: List[Dict[str, Any]],
+                           post_lint_results: List[Dict[str, Any]], label: str = ""):
+        """수정 전후 lint 문제 수 비교 출력"""
+        improvement = len(lint_results) - len(post_lint_results)
+        print(f"📊 {label}개선 결과: {improvement}개 문제 해결 ({len(post_lint_results)}개 남음)")
+    
+    def _iter_markdown_files(self, directory_path: str, recursive: bool = True) -> Iterator[str]:
+        """디렉토리의 마크다운 파일 경로를 순회
         
-        if recursive:
-            md_files = list(directory.rglob("*.md"))
-        else:
-            md_files = list(directory.glob("*.md"))
+        os.scandir가 디렉토리 항목과 함께 읽어 온 파일 종류 정보를 사용하므로
+        파일마다 stat을 호출하지 않습니다. 심볼릭 링크는 따라가지 않으며,
+        권한이 없거나 읽을 수 없는 디렉토리는 경고 후 건너뜁니다.
+        """
+        try:
+            with os.scandir(directory_path) as it:
+                entries = list(it)
+        except OSError as e:
+            print(f"⚠️  디렉토리를 읽을 수 없어 건너뜁니다: {directory_path} ({e})")
+            return
+        
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                if recursive:
+                    yield from self._iter_markdown_files(entry.path, recursive)
+            elif entry.name.endswith('.md') and entry.is_file(follow_symlinks=False):
+                yield entry.path
+    
+    def process_directory(self, directory_path: str, recursive: bool = True, num_workers: int = None) -> Dict[str, bool]:
+        """디렉토리 내 모든 마크다운 파일 처리
+        
+        파일별 작업은 lint 서브프로세스와 Ollama HTTP 호출을 기다리는 시간이 대부분이므로
+        스레드 풀로 여러 파일을 동시에 처리합니다.
+        """
+        if num_workers is None:
+            num_workers = min(8, os.cpu_count() or 1)
         
-        print(f"📁 {len(md_files)}개의 마크다운 파일 발견")
+        md_paths = list(self._iter_markdown_files(directory_path, recursive))
         
-        for md_file in md_files:
-            print(f"\n처리 중: {md_file}")
-            self.process_file(str(md_file))
+        print(f"📁 {len(md_paths)}개의 마크다운 파일 발견 (동시 처리: {num_workers}개)")
+        
+        # 전체 파일을 한 번에 lint (lint에 실패하면 문제 없음으로 보고 건너뛰지 않도록 전체 실패 처리)
+        try:
+            lint_results = self.linter.lint_files(md_paths)
+        except RuntimeError as e:
+            print(f"❌ Lint 실행 중 오류 발생: {e}")
+            return {md_path: False for md_path in md_paths}
+        
+        # 수정할 파일 중 내용과 lint 결과가 같은 파일은 대표 파일 하나만 수정하고 결과를 복사
+        # (디렉토리마다 markdownlint 설정이 다를 수 있으므로 내용이 같아도 lint 결과까지 비교)
+        duplicate_groups = defaultdict(list)
+        for md_path in md_paths:
+            if lint_results[md_path]:
+                with open(md_path, 'rb') as f:
+                    content_hash = hashlib.blake2b(f.read()).hexdigest()
+                issues = tuple(sorted((issue['line'], issue['rule']) for issue in lint_results[md_path]))
+                duplicate_groups[(content_hash, issues)].append(md_path)
+        duplicates = {group[0]: group[1:] for group in duplicate_groups.values() if len(group) > 1}
+        duplicate_paths = {md_path for copies in duplicates.values() for md_path in copies}
+        if duplicate_paths:
+            print(f"♻️  내용이 같은 파일 {len(duplicate_paths)}개는 수정 결과를 복사합니다")
+        
+        def process_one(md_path: str) -> bool:
+            print(f"\n처리 중: {md_path}")
+            # 검증은 아래에서 모든 파일을 한 번에 lint
+            return self.process_file(md_path, lint_results=lint_results[md_path], verify=False)
+        
+        unique_paths = [md_path for md_path in md_paths if md_path not in duplicate_paths]
+        with ThreadPoolExecutor(max_workers=max(1, num_workers)) as executor:
+            results = dict(zip(unique_paths, executor.map(process_one, unique_paths)))
+        
+        for md_path, copies in duplicates.items():
+            for copy_path in copies:
+                if results[md_path]:
+                    shutil.copyfile(md_path, copy_path)
+                results[copy_path] = results[md_path]
+        
+        if self.verify:
+            fixed_paths = [md_path for md_path in md_paths if results[md_path] and lint_results[md_path]]
+            try:
+                post_lint_results = self.linter.lint_files(fixed_paths)
+                for md_path in fixed_paths:
+                    self._print_improvement(lint_results[md_path], post_lint_results[md_path], f"{md_path} ")
+            except RuntimeError as e:
+                print(f"⚠️  수정 후 lint 실패: {e}")
+        
+        return {md_path: results[md_path] for md_path in md_paths}
 
 
 def main():
     """메인 실행 함수 - 파일 경로를 입력받아 처리"""
     import sys
     
-    if len(sys.argv) < 2:
-        print("🦙 Ollama 기반 마크다운 자동 수정 시스템")
-        print("📋 사용법: python mdfm_ollama.py <파일경로> [모델명]")
-        print("📝 예시: python mdfm_ollama.py tests/example.md")
-        print("📝 모델 지정: python mdfm_ollama.py tests/example.md llama3.1:8b")
-        print("💾 출력: 원본 파일에 직접 저장됩니다")
-        print("📊 주요 수정 사항: MD007(들여쓰기), MD032(목록 공백), MD022(헤딩 공백) 등")
-        print()
-        print("🔧 Ollama 설정:")
-        print("   1. Ollama 설치: https://ollama.ai")
-        print("   2. 모델 다운로드: ollama pull llama3.1:8b")
-        print("   3. 서버 실행: ollama serve (보통 자동 실행)")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(
+        description='🦙 Ollama 기반 마크다운 자동 수정 시스템 - markdownlint-cli2 결과를 바탕으로 파일을 수정해 원본에 직접 저장합니다.',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""예시:
+  python mdfm_ollama.py tests/example.md
+  python mdfm_ollama.py tests/example.md llama3.1:8b
+
+주요 수정 사항: MD007(들여쓰기), MD032(목록 공백), MD022(헤딩 공백) 등
+
+Ollama 설정:
+  1. Ollama 설치: https://ollama.ai
+  2. 모델 다운로드: ollama pull llama3.1:8b
+  3. 서버 실행: ollama serve (보통 자동 실행)
+  4. 모델 유지 시간: 요청마다 30분간 메모리에 유지 (서버 기본값은 OLLAMA_KEEP_ALIVE 환경변수로 설정)"""
+    )
+    parser.add_argument(
+        'path',
+        help='수정할 마크다운 파일 경로'
+    )
+    parser.add_argument(
+        'model',
+        nargs='?',
+        default='qwen3:30b-32k-0.0',
+        help='사용할 Ollama 모델 (기본값: qwen3:30b-32k-0.0)'
+    )
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help=f'LLM 응답 캐시를 사용하지 않음 (캐시 경로: {DEFAULT_CACHE_PATH})'
+    )
+    parser.add_argument(
+        '--verify',
+        action='store_true',
+        help='수정 후 lint를 다시 실행해 개선 결과 출력'
+    )
+    parser.add_argument(
+        '--num-ctx',
+        type=int,
+        default=MarkdownFixer.DEFAULT_CTX,
+        help=f'Ollama 컨텍스트(num_ctx) 크기, 큰 문서를 한 번에 수정하려면 늘리기 (기본값: {MarkdownFixer.DEFAULT_CTX})'
+    )
     
-    file_path = sys.argv[1]
-    model_name = sys.argv[2] if len(sys.argv) > 2 else "qwen3:30b-32k-0.0"
+    args = parser.parse_args()
+    file_path = args.path
+    model_name = args.model
     
     if not os.path.exists(file_path):
         print(f"❌ 오류: 파일 '{file_path}'을 찾을 수 없습니다.")
@@ -307,9 +832,18 @@ def main():
         print(f"❌ 오류: 마크다운 파일(.md)만 처리할 수 있습니다.")
         sys.exit(1)
     
-    # Ollama 연결 테스트
+    # 프로세서 초기화
+    cache = None if args.no_cache else LLMCache(DEFAULT_CACHE_PATH)
     try:
-        response = requests.get("http://localhost:11434/api/tags", timeout=5)
+        processor = MarkdownProcessor(model_name=model_name, cache=cache, verify=args.verify,
+                                      num_ctx=args.num_ctx)
+    except RuntimeError as e:
+        print(f"❌ 오류: {e}")
+        sys.exit(1)
+    
+    # Ollama 연결 테스트 (수정 요청과 같은 세션 사용)
+    try:
+        response = processor.fixer._session.get(f"{processor.fixer.ollama_url}/api/tags", timeout=5)
         if response.status_code == 200:
             models = response.json().get('models', [])
             model_names = [model['name'] for model in models]
@@ -327,8 +861,11 @@ def main():
         print("   Ollama가 실행 중인지 확인하세요: ollama serve")
         sys.exit(1)
     
-    # 프로세서 초기화 및 파일 처리
-    processor = MarkdownProcessor(model_name=model_name)
+    # 첫 파일이 모델 로드 시간을 떠안지 않도록 미리 예열
+    print(f"🔥 모델 예열 중... ({model_name})")
+    processor.fixer.warm_up()
+    
+    # 파일 처리
     success = processor.process_file(file_path)
     
     if success:
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+OpenAI 요청 속도 제한 워커
+
+분당 요청 수(RPM)와 분당 토큰 수(TPM) 한도를 토큰 버킷으로 관리하여
+429 오류에 부딪히기 전에 요청 속도를 조절합니다.
+OpenAI cookbook의 api_request_parallel_processor.py 설계를 따릅니다.
+"""
+
+import time
+import random
+import asyncio
+from typing import Any, Awaitable, Callable, Optional
+import httpx
+import openai
+import tiktoken
+
+
+def make_async_http_client(max_connections: int = 200, max_keepalive_connections: int = 100,
+                           timeout: float = 600.0) -> httpx.AsyncClient:
+    """
+    여러 요청이 연결 풀을 공유하도록 설정한 httpx.AsyncClient를 생성합니다.
+
+    기본 연결 수 제한보다 넉넉하게 잡아 동시 요청이 많을 때 연결 대기로 막히지 않게 합니다.
+    """
+    return httpx.AsyncClient(
+        limits=httpx.Limits(max_connections=max_connections,
+                            max_keepalive_connections=max_keepalive_connections),
+        timeout=httpx.Timeout(timeout, connect=10.0)
+    )
+
+
+class AsyncOpenAIWorker:
+    def __init__(self, max_requests_per_minute: float = 500, max_tokens_per_minute: float = 200000,
+                 max_attempts: int = 5, max_in_flight: int = 8, encoding_name: str = "cl100k_base"):
+        """
+        속도 제한 워커 초기화
+
+        Args:
+            max_requests_per_minute: 분당 최대 요청 수 (RPM)
+            max_tokens_per_minute: 분당 최대 토큰 수 (TPM)
+            max_attempts: 요청당 최대 시도 횟수
+            max_in_flight: 동시에 진행 중인 최대 요청 수
+            encoding_name: 토큰 수 추정에 사용할 tiktoken 인코딩
+        """
+        self.max_requests_per_minute = max_requests_per_minute
+        self.max_tokens_per_minute = max_tokens_per_minute
+        self.max_attempts = max(1, max_attempts)
+        self.available_request_capacity = max_requests_per_minute
+        self.available_token_capacity = max_tokens_per_minute
+        self.last_update_time = time.monotonic()
+        self.encoding = tiktoken.get_encoding(encoding_name)
+        self._in_flight = asyncio.Semaphore(max(1, max_in_flight))
+        self._lock = asyncio.Lock()
+        # 429 응답을 받으면 모든 요청을 잠시 멈춤
+        self._cooldown_until = 0.0
+
+    def estimate_tokens(self, *texts: str, completion_tokens: int = 0) -> int:
+        """요청에 소모될 토큰 수를 추정합니다. (프롬프트 + 최대 응답 토큰)"""
+        prompt_tokens = sum(len(self.encoding.encode(text)) for text in texts if text)
+        return prompt_tokens + completion_tokens
+
+    def _replenish(self):
+        """경과 시간에 비례하여 요청/토큰 용량을 채웁니다."""
+        now = time.monotonic()
+        elapsed = now - self.last_update_time
+        self.available_request_capacity = min(
+            self.available_request_capacity + self.max_requests_per_minute * elapsed / 60.0,
+            self.max_requests_per_minute
+        )
+        self.available_token_capacity = min(
+            self.available_token_capacity + self.max_tokens_per_minute * elapsed / 60.0,
+            self.max_tokens_per_minute
+        )
+        self.last_update_time = now
+
+    async def _acquire(self, token_cost: int):
+        """요청과 토큰 용량이 모두 확보될 때까지 기다립니다."""
+        # 한도보다 큰 요청이 영원히 대기하지 않도록 제한
+        token_cost = min(token_cost, self.max_tokens_per_minute)
+        while True:
+            async with self._lock:
+                cooldown = self._cooldown_until - time.monotonic()
+                if cooldown <= 0:
+                    self._replenish()
+                    if self.available_request_capacity >= 1 and self.available_token_capacity >= token_cost:
+                        self.available_request_capacity -= 1
+                        self.available_token_capacity -= token_cost
+                        return
+                    # 부족한 용량이 채워지는 데 필요한 시간만큼 대기
+                    request_wait = (1 - self.available_request_capacity) * 60.0 / self.max_requests_per_minute
+                    token_wait = (token_cost - self.available_token_capacity) * 60.0 / self.max_tokens_per_minute
+                    cooldown = max(request_wait, token_wait, 0.001)
+            await asyncio.sleep(cooldown)
+
+    @staticmethod
+    def _is_retryable(error: Exception) -> bool:
+        """재시도할 가치가 있는 일시적 오류(429/5xx/연결 오류)인지 확인합니다."""
+        if isinstance(error, openai.APIConnectionError):
+            return True
+        status_code = getattr(error, 'status_code', None)
+        return status_code == 429 or (status_code is not None and status_code >= 500)
+
+    async def submit(self, request_fn: Callable[[], Awaitable[Any]], token_cost: int,
+                     label: Optional[str] = None) -> Any:
+        """
+        속도 제한을 지키며 요청을 실행합니다.
+
+        Args:
+            request_fn: 실제 API 호출을 수행하는 코루틴 함수
+            token_cost: estimate_tokens로 추정한 토큰 수
+            label: 로그에 표시할 요청 이름
+
+        Returns:
+            request_fn의 반환값 (재시도 불가능한 오류나 최대 시도 초과 시 예외 발생)
+        """
+        async with self._in_flight:
+            for attempt in range(1, self.max_attempts + 1):
+                await self._acquire(token_cost)
+                try:
+                    return await request_fn()
+                except Exception as e:
+                    if not self._is_retryable(e) or attempt == self.max_attempts:
+                        raise
+                    delay = min(2 ** attempt, 60) + random.random()
+                    if getattr(e, 'status_code', None) == 429:
+                        async with self._lock:
+                            self._cooldown_until = max(self._cooldown_until, time.monotonic() + delay)
+                    print(f"⏳ {label or 'OpenAI 요청'} 재시도 {attempt}/{self.max_attempts - 1} "
+                          f"({delay:.1f}초 후): {e}")
+                    await asyncio.sleep(delay)